@@ -5,6 +5,7 @@ import time
 from abc import ABC, abstractmethod
 from enum import Enum
 from contextlib import contextmanager
+from itertools import chain
 from operator import methodcaller
 from typing import Any, Dict, Set, List, Tuple, Iterator, Optional, Union
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -96,8 +97,12 @@ class DiffResultWrapper:
             self.result_list.append(i)
             yield i
 
-    def _get_stats(self, is_dbt: bool = False) -> DiffStats:
-        list(self)  # Consume the iterator into result_list, if we haven't already
+    def _get_stats(self, is_dbt: bool = False, keep_rows: bool = True) -> DiffStats:
+        if keep_rows:
+            list(self)  # Consume the iterator into result_list, if we haven't already
+            rows = self.result_list
+        else:
+            rows = chain(self.result_list, self.diff)
 
         key_columns = self.info_tree.info.tables[0].key_columns
         len_key_columns = len(key_columns)
@@ -108,7 +113,7 @@ class DiffResultWrapper:
             extra_columns = self.info_tree.info.tables[0].extra_columns
             extra_column_diffs = {k: 0 for k in extra_columns}
 
-        for sign, values in self.result_list:
+        for sign, values in rows:
             k = values[:len_key_columns]
             if is_dbt:
                 extra_column_values = values[len_key_columns:]
@@ -135,6 +140,18 @@ class DiffResultWrapper:
 
         return DiffStats(diff_by_sign, table1_count, table2_count, unchanged, diff_percent, extra_column_diffs)
 
+    def get_row_counts(self) -> Tuple[int, int]:
+        """Return the row counts of both tables, without computing the rest of the stats"""
+        list(self)  # Row counts are only complete once the diff has been consumed
+        rowcounts = self.info_tree.info.rowcounts
+        return rowcounts[1], rowcounts[2]
+
+    def get_diff_count(self) -> int:
+        """Return the number of differing keys (get_stats_dict()["total"]), without computing the rest of the stats"""
+        list(self)
+        len_key_columns = len(self.info_tree.info.tables[0].key_columns)
+        return len({values[:len_key_columns] for _sign, values in self.result_list})
+
     def get_stats_string(self, is_dbt: bool = False):
         diff_stats = self._get_stats(is_dbt)
 
@@ -170,8 +187,13 @@ class DiffResultWrapper:
 
         return string_output
 
-    def get_stats_dict(self, is_dbt: bool = False):
-        diff_stats = self._get_stats(is_dbt)
+    def get_stats_dict(self, is_dbt: bool = False, keep_rows: bool = True):
+        """Return the diff stats as a dict.
+
+        With keep_rows=False, the remaining diff rows are counted as they stream in instead of being stored,
+        so the wrapper can no longer be iterated afterwards.
+        """
+        diff_stats = self._get_stats(is_dbt, keep_rows)
         json_output = {
             "rows_A": diff_stats.table1_count,
             "rows_B": diff_stats.table2_count,
@@ -2,12 +2,31 @@
 MigrationAgent - 数据迁移代理核心实现
 """
 
+import hashlib
+import json
 import logging
+import os
+import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Optional, Any, Tuple
-from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Any, Tuple
+from dataclasses import asdict, dataclass, field, replace
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
 
 from data_diff import connect_to_table, diff_tables, Algorithm
 from data_diff.databases import Database
@@ -15,9 +34,134 @@ from data_diff.databases._connect import connect
 from data_diff.migration.sql_translator import SQLTranslator, DatabaseDialect
 from data_diff.migration.validator import MigrationValidator
 from data_diff.utils import getLogger
+from data_diff.version import __version__
 
 logger = getLogger(__name__)
 
+# 命令行默认的任务状态文件
+DEFAULT_STATE_PATH = "~/.data_diff/migration_state.json"
+# 命令行默认的 SQL 转换结果缓存目录
+DEFAULT_TRANSLATION_CACHE_DIR = "~/.cache/data_diff/xlate"
+# 转换结果缓存目录的大小上限，超出时删除最久未使用的缓存文件
+TRANSLATION_CACHE_MAX_BYTES = 256 << 20
+# 单个任务并行读取、转换 SQL 文件的默认最大线程数
+MAX_FILE_WORKERS = 32
+
+
+def _read_file(path: str) -> str:
+    """读取整个 UTF-8 文本文件
+
+    按 fstat 得到的文件大小 os.read，通常一次读完，避免缓冲文本 IO 的多次拷贝和分块读取。
+    os.read 可能少读（单次读取上限约 2GB、网络文件系统），文件也可能在读取时变长，
+    因此循环读到 EOF，不以文件大小判断是否读完。换行符与文本模式 open() 一样统一为 '\\n'；
+    不是合法的 UTF-8 时抛出 UnicodeDecodeError。
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        remaining = os.fstat(fd).st_size
+        chunks = []
+        while True:
+            # 少读时继续读取剩余部分；文件变长时 remaining 为负，按 64KB 读到 EOF
+            chunk = os.read(fd, max(remaining, 1 << 16))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+    finally:
+        os.close(fd)
+    
+    text = b"".join(chunks).decode("utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def _resolve_dialect(database: str) -> DatabaseDialect:
+    """获取连接字符串对应的方言，只有 scheme 无法识别时才真正连接数据库"""
+    try:
+        return DatabaseDialect.from_url(database)
+    except ValueError:
+        return DatabaseDialect.from_database(connect(database, thread_count=1))
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    """先写临时文件再替换，避免中途失败留下损坏的文件"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """在锁文件上加进程间排他锁"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _translation_cache_key(sources: List[Tuple[str, str]], statements: List[str],
+                           source_dialect: DatabaseDialect, target_dialect: DatabaseDialect,
+                           rules_fingerprint: str) -> str:
+    """根据转换输入（文件内容、语句、方言对）、规则指纹和 data-diff 版本计算缓存键
+    
+    规则指纹包含规则和转换器选项；版本号使升级后转换代码的变化也让旧缓存失效。
+    """
+    h = hashlib.blake2b(digest_size=20)
+    header = [__version__, source_dialect.value, target_dialect.value, rules_fingerprint, len(sources), statements]
+    h.update(json.dumps(header, ensure_ascii=False).encode("utf-8"))
+    for sql_file, sql in sources:
+        # 带上长度，避免相邻字段拼接产生歧义
+        for value in (sql_file, sql):
+            data = value.encode("utf-8")
+            h.update(len(data).to_bytes(8, "little"))
+            h.update(data)
+    return h.hexdigest()
+
+
+def _prune_cache(directory: str, max_bytes: int) -> None:
+    """目录中文件总大小超过 max_bytes 时，按最后使用时间从旧到新删除文件"""
+    entries = []
+    total = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.is_file() or not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    
+    entries.sort()
+    for _mtime, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
 
 class MigrationStatus(Enum):
     """迁移状态"""
@@ -67,25 +211,197 @@ class MigrationProgress:
     stats: Dict[str, Any] = field(default_factory=dict)
 
 
+def _task_to_dict(task: MigrationTask) -> Dict[str, Any]:
+    """将任务转换为可 JSON 序列化的字典"""
+    return asdict(task)
+
+
+def _task_from_dict(data: Dict[str, Any]) -> MigrationTask:
+    """从字典恢复任务（JSON 中的元组会变成列表）"""
+    data = dict(data)
+    data["key_columns"] = tuple(data["key_columns"])
+    data["extra_columns"] = tuple(data["extra_columns"])
+    return MigrationTask(**data)
+
+
+def _progress_to_dict(progress: MigrationProgress) -> Dict[str, Any]:
+    """将进度转换为可 JSON 序列化的字典"""
+    data = asdict(progress)
+    data["status"] = progress.status.value
+    data["started_at"] = progress.started_at.isoformat() if progress.started_at else None
+    data["completed_at"] = progress.completed_at.isoformat() if progress.completed_at else None
+    return data
+
+
+# 不写入状态文件的统计项（转换结果单独保存，见 MigrationAgent.get_translations）
+_STATE_EXCLUDED_STATS = ("translated_sqls",)
+
+
+def _progress_to_state(progress: MigrationProgress) -> Dict[str, Any]:
+    """将进度转换为写入状态文件的字典"""
+    stats = {key: value for key, value in progress.stats.items() if key not in _STATE_EXCLUDED_STATS}
+    return _progress_to_dict(replace(progress, stats=stats))
+
+
+def _progress_from_dict(data: Dict[str, Any]) -> MigrationProgress:
+    """从字典恢复进度"""
+    data = dict(data)
+    data["status"] = MigrationStatus(data["status"])
+    for key in ("started_at", "completed_at"):
+        if data[key]:
+            data[key] = datetime.fromisoformat(data[key])
+    return MigrationProgress(**data)
+
+
+def _dumps(obj: Any) -> bytes:
+    """序列化为 JSON；安装了 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def progress_to_json(progress: MigrationProgress) -> bytes:
+    """将进度序列化为 UTF-8 JSON（与状态文件格式相同），安装了 orjson 时使用 orjson"""
+    return _dumps(_progress_to_dict(progress))
+
+
+def _loads(data: bytes) -> Any:
+    """解析 JSON；安装了 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 class MigrationAgent:
-    """数据迁移代理"""
+    """数据迁移代理
+    
+    Args:
+        state_path: 任务状态文件路径。提供时启动加载已有任务，任务变更后写回，
+            使多次命令行调用之间可以共享任务；为 None 时任务只保存在内存中。
+            写回时持有文件锁并与文件中的内容合并，只覆盖本次变更的任务，
+            其他进程同时创建、取消的任务不会丢失。转换结果不写入状态文件，
+            而是保存在 "<state_path>.translations" 目录下，每个任务一个文件。
+        translation_cache_dir: SQL 转换结果缓存目录。提供时按输入内容、规则指纹和
+            data-diff 版本缓存转换结果，重试或恢复任务时不再重复转换；为 None 时不缓存。
+            目录总大小超过 TRANSLATION_CACHE_MAX_BYTES 时删除最久未使用的缓存。
     
-    def __init__(self):
+    可以在多个线程中同时调用：不同任务并行执行，同一任务的执行互斥。
+    """
+    
+    def __init__(self, state_path: Optional[str] = None, translation_cache_dir: Optional[str] = None):
         self.tasks: Dict[str, MigrationTask] = {}
         self.progress: Dict[str, MigrationProgress] = {}
         self.sql_translator = SQLTranslator()
         self.validator = MigrationValidator()
+        self.state_path = os.path.expanduser(state_path) if state_path else None
+        self.translation_cache_dir = os.path.expanduser(translation_cache_dir) if translation_cache_dir else None
+        # 保护 tasks、progress、各任务的 stats 以及状态文件的读写
+        self._lock = threading.RLock()
+        # 每个任务一把锁，同一任务不会被同时执行
+        self._task_locks: Dict[str, threading.Lock] = {}
+        self._load_state()
+    
+    def _load_state(self) -> None:
+        """从状态文件加载任务和进度"""
+        if not self.state_path:
+            return
+        
+        with _file_lock(self.state_path + ".lock"):
+            tasks, progress = self._read_state()
+        self.tasks.update(tasks)
+        self.progress.update(progress)
+    
+    def _read_state(self) -> Tuple[Dict[str, MigrationTask], Dict[str, MigrationProgress]]:
+        """读取状态文件（调用方需持有文件锁）
+        
+        文件已损坏时记录错误，把它备份为 "<state_path>.corrupt-<时间>"，按空状态处理。
+        """
+        try:
+            with open(self.state_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return {}, {}
+        
+        try:
+            state = _loads(data)
+            tasks = {task_id: _task_from_dict(task) for task_id, task in state.get("tasks", {}).items()}
+            progress = {
+                task_id: _progress_from_dict(progress) for task_id, progress in state.get("progress", {}).items()
+            }
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            backup = f"{self.state_path}.corrupt-{time.strftime('%Y%m%d%H%M%S')}"
+            os.replace(self.state_path, backup)
+            logger.error("任务状态文件已损坏，已备份到 %s，使用空状态: %s", backup, e)
+            return {}, {}
+        return tasks, progress
+    
+    def _save_state(self, task_id: str) -> None:
+        """将任务 task_id 的定义和进度写回状态文件
+        
+        持有文件锁重新读取状态文件，只替换该任务的条目，其他任务保留文件中的内容；
+        其他进程新建的任务同时加载到内存。其他进程已取消该任务时保留取消状态。
+        """
+        if not self.state_path:
+            return
+        
+        with self._lock, _file_lock(self.state_path + ".lock"):
+            tasks, progress = self._read_state()
+            
+            mine = self.progress[task_id]
+            theirs = progress.get(task_id)
+            if (theirs is not None and theirs.status == MigrationStatus.CANCELLED
+                    and mine.status != MigrationStatus.CANCELLED):
+                logger.info("迁移任务 %s 已被其他进程取消", task_id)
+                mine.status = MigrationStatus.CANCELLED
+                mine.current_step = theirs.current_step
+                mine.completed_at = theirs.completed_at
+            
+            tasks[task_id] = self.tasks[task_id]
+            progress[task_id] = mine
+            for other_id, task in tasks.items():
+                if other_id not in self.tasks and other_id in progress:
+                    self.tasks[other_id] = task
+                    self.progress[other_id] = progress[other_id]
+            
+            state = {
+                "tasks": {task_id: _task_to_dict(task) for task_id, task in tasks.items()},
+                "progress": {task_id: _progress_to_state(progress) for task_id, progress in progress.items()},
+            }
+            _atomic_write(self.state_path, _dumps(state))
+    
+    def _translations_path(self, task_id: str) -> str:
+        return os.path.join(self.state_path + ".translations", f"{task_id}.json")
+    
+    def get_translations(self, task_id: str) -> Optional[List[Dict[str, str]]]:
+        """获取任务的 SQL 转换结果，任务尚未转换时返回 None"""
+        progress = self.progress.get(task_id)
+        if progress is not None and "translated_sqls" in progress.stats:
+            return progress.stats["translated_sqls"]
+        if not self.state_path:
+            return None
+        try:
+            with open(self._translations_path(task_id), "rb") as f:
+                return _loads(f.read())
+        except FileNotFoundError:
+            return None
+    
+    def _task_lock(self, task_id: str) -> threading.Lock:
+        """获取任务的执行锁"""
+        with self._lock:
+            return self._task_locks.setdefault(task_id, threading.Lock())
     
     def create_task(self, task: MigrationTask) -> str:
         """创建迁移任务"""
-        if task.task_id in self.tasks:
-            raise ValueError(f"任务 ID '{task.task_id}' 已存在")
-        
-        self.tasks[task.task_id] = task
-        self.progress[task.task_id] = MigrationProgress(
-            task_id=task.task_id,
-            status=MigrationStatus.PENDING
-        )
+        with self._lock:
+            if task.task_id in self.tasks:
+                raise ValueError(f"任务 ID '{task.task_id}' 已存在")
+            
+            self.tasks[task.task_id] = task
+            self.progress[task.task_id] = MigrationProgress(
+                task_id=task.task_id,
+                status=MigrationStatus.PENDING
+            )
+            self._save_state(task.task_id)
         
         logger.info(f"创建迁移任务: {task.task_id}")
         return task.task_id
@@ -98,11 +414,36 @@ class MigrationAgent:
         """获取迁移进度"""
         return self.progress.get(task_id)
     
-    def execute_migration(self, task_id: str) -> MigrationProgress:
-        """执行迁移任务"""
+    def execute_migration(self, task_id: str, max_workers: Optional[int] = None) -> MigrationProgress:
+        """执行迁移任务
+        
+        Args:
+            task_id: 任务 ID
+            max_workers: 并行读取、转换 SQL 文件的最大线程数，默认 min(MAX_FILE_WORKERS, 文件数)
+        """
         if task_id not in self.tasks:
             raise ValueError(f"任务 ID '{task_id}' 不存在")
         
+        with self._task_lock(task_id):
+            return self._execute_migration(task_id, max_workers)
+    
+    def execute_many(self, task_ids: List[str], max_workers: int = 4) -> List[MigrationProgress]:
+        """在线程池中并行执行多个迁移任务，返回的进度与 task_ids 顺序一致"""
+        if not task_ids:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(task_ids))) as executor:
+            return list(executor.map(self.execute_migration, task_ids))
+    
+    def execute_all(self, max_workers: int = 4) -> List[MigrationProgress]:
+        """并行执行所有待执行（PENDING）的迁移任务"""
+        with self._lock:
+            task_ids = [
+                task_id for task_id, progress in self.progress.items()
+                if progress.status == MigrationStatus.PENDING
+            ]
+        return self.execute_many(task_ids, max_workers)
+    
+    def _execute_migration(self, task_id: str, max_workers: Optional[int] = None) -> MigrationProgress:
         task = self.tasks[task_id]
         progress = self.progress[task_id]
         
@@ -115,7 +456,7 @@ class MigrationAgent:
             if task.sql_files or task.sql_statements:
                 progress.current_step = "转换 SQL 语句"
                 progress.progress_percent = 10.0
-                self._translate_sql(task, progress)
+                self._translate_sql(task, progress, max_workers)
             
             # 步骤2: 数据迁移（这里只是示例，实际需要调用具体的迁移工具）
             progress.current_step = "执行数据迁移"
@@ -133,6 +474,7 @@ class MigrationAgent:
                 if not validation_result["success"]:
                     progress.status = MigrationStatus.FAILED
                     progress.error = f"验证失败: {validation_result.get('error')}"
+                    self._save_state(task_id)
                     return progress
             
             # 完成
@@ -149,34 +491,38 @@ class MigrationAgent:
             progress.completed_at = datetime.now()
             logger.error(f"迁移任务 {task_id} 失败: {e}", exc_info=True)
         
+        self._save_state(task_id)
         return progress
     
-    def _translate_sql(self, task: MigrationTask, progress: MigrationProgress) -> None:
+    def _translate_sql(self, task: MigrationTask, progress: MigrationProgress,
+                       max_workers: Optional[int] = None) -> None:
         """转换 SQL 语句"""
-        source_db = connect(task.source_database, thread_count=1)
-        target_db = connect(task.target_database, thread_count=1)
+        source_dialect = _resolve_dialect(task.source_database)
+        target_dialect = _resolve_dialect(task.target_database)
         
-        source_dialect = DatabaseDialect.from_database(source_db)
-        target_dialect = DatabaseDialect.from_database(target_db)
-        
-        translated_sqls = []
-        
-        # 转换 SQL 文件
-        for sql_file in task.sql_files:
-            try:
-                with open(sql_file, 'r', encoding='utf-8') as f:
-                    sql = f.read()
-                    translated = self.sql_translator.translate(
-                        sql, source_dialect, target_dialect
-                    )
-                    translated_sqls.append({
-                        "file": sql_file,
-                        "original": sql,
-                        "translated": translated
-                    })
-            except Exception as e:
-                logger.error(f"转换 SQL 文件 {sql_file} 时出错: {e}")
-                raise
+        workers = max_workers or min(MAX_FILE_WORKERS, len(task.sql_files) or 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # 并行读取 SQL 文件，结果按文件顺序返回
+            sources = list(zip(task.sql_files, executor.map(self._read_sql_file, task.sql_files)))
+            
+            cache_path = None
+            if self.translation_cache_dir:
+                key = _translation_cache_key(
+                    sources, task.sql_statements, source_dialect, target_dialect,
+                    self.sql_translator.rules_fingerprint(source_dialect, target_dialect)
+                )
+                cache_path = os.path.join(self.translation_cache_dir, f"{key}.json")
+                translated_sqls = self._load_translations(cache_path)
+                if translated_sqls is not None:
+                    self._store_translations(task.task_id, progress, translated_sqls)
+                    logger.info("使用缓存的转换结果，共 %d 条 SQL 语句", len(translated_sqls))
+                    return
+            
+            # 转换 SQL 文件
+            translated_sqls = list(executor.map(
+                lambda source: self._translate_one_file(*source, source_dialect, target_dialect),
+                sources
+            ))
         
         # 转换 SQL 语句
         for sql in task.sql_statements:
@@ -189,11 +535,63 @@ class MigrationAgent:
                     "translated": translated
                 })
             except Exception as e:
-                logger.error(f"转换 SQL 语句时出错: {e}")
+                logger.error("转换 SQL 语句时出错: %s", e)
                 raise
         
-        progress.stats["translated_sqls"] = translated_sqls
-        logger.info(f"已转换 {len(translated_sqls)} 条 SQL 语句")
+        if cache_path:
+            _atomic_write(cache_path, _dumps(translated_sqls))
+            _prune_cache(self.translation_cache_dir, TRANSLATION_CACHE_MAX_BYTES)
+        
+        self._store_translations(task.task_id, progress, translated_sqls)
+        logger.info("已转换 %d 条 SQL 语句", len(translated_sqls))
+    
+    def _store_translations(self, task_id: str, progress: MigrationProgress,
+                            translated_sqls: List[Dict[str, str]]) -> None:
+        """保存转换结果：内存中放在 stats 里，有状态文件时另存为单独的文件"""
+        if self.state_path:
+            _atomic_write(self._translations_path(task_id), _dumps(translated_sqls))
+        with self._lock:
+            progress.stats["translated_sqls"] = translated_sqls
+            progress.stats["translated_count"] = len(translated_sqls)
+    
+    @staticmethod
+    def _read_sql_file(sql_file: str) -> str:
+        """读取单个 SQL 文件"""
+        try:
+            return _read_file(sql_file)
+        except Exception as e:
+            logger.error("读取 SQL 文件 %s 时出错: %s", sql_file, e)
+            raise
+    
+    @staticmethod
+    def _load_translations(cache_path: str) -> Optional[List[Dict[str, str]]]:
+        """读取缓存的转换结果，不存在或已损坏时返回 None"""
+        try:
+            with open(cache_path, "rb") as f:
+                translated_sqls = _loads(f.read())
+            # 更新修改时间，清理缓存时按最久未使用的顺序删除
+            os.utime(cache_path)
+            return translated_sqls
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning("转换缓存文件已损坏，将重新转换: %s", cache_path)
+            return None
+    
+    def _translate_one_file(self, sql_file: str, sql: str, source_dialect: DatabaseDialect,
+                            target_dialect: DatabaseDialect) -> Dict[str, str]:
+        """转换单个 SQL 文件的内容"""
+        try:
+            translated = self.sql_translator.translate(sql, source_dialect, target_dialect)
+        except Exception as e:
+            logger.error("转换 SQL 文件 %s 时出错: %s", sql_file, e)
+            raise
+        
+        return {
+            "file": sql_file,
+            "original": sql,
+            "translated": translated
+        }
     
     def _validate_migration(self, task: MigrationTask, progress: MigrationProgress) -> Dict[str, Any]:
         """验证迁移结果"""
@@ -209,7 +607,8 @@ class MigrationAgent:
                 threshold=task.validation_threshold
             )
             
-            progress.stats["validation"] = result
+            with self._lock:
+                progress.stats["validation"] = result
             
             if result["success"]:
                 logger.info(f"迁移验证通过: {result.get('diff_count', 0)} 条差异")
@@ -227,21 +626,24 @@ class MigrationAgent:
     
     def cancel_task(self, task_id: str) -> bool:
         """取消迁移任务"""
-        if task_id not in self.tasks:
-            return False
-        
-        progress = self.progress[task_id]
-        if progress.status in (MigrationStatus.COMPLETED, MigrationStatus.FAILED, MigrationStatus.CANCELLED):
-            return False
-        
-        progress.status = MigrationStatus.CANCELLED
-        progress.completed_at = datetime.now()
-        progress.current_step = "已取消"
+        with self._lock:
+            if task_id not in self.tasks:
+                return False
+            
+            progress = self.progress[task_id]
+            if progress.status in (MigrationStatus.COMPLETED, MigrationStatus.FAILED, MigrationStatus.CANCELLED):
+                return False
+            
+            progress.status = MigrationStatus.CANCELLED
+            progress.completed_at = datetime.now()
+            progress.current_step = "已取消"
+            self._save_state(task_id)
         
         logger.info(f"迁移任务 {task_id} 已取消")
         return True
     
     def list_tasks(self) -> List[MigrationTask]:
         """列出所有迁移任务"""
-        return list(self.tasks.values())
+        with self._lock:
+            return list(self.tasks.values())
 
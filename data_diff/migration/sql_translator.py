@@ -5,9 +5,25 @@ SQLTranslator - SQL 转换器
 """
 
 import re
+import hashlib
 import logging
+import threading
 from enum import Enum
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache, partial
+from urllib.parse import urlparse
+from typing import Callable, Dict, Iterator, List, Match, Optional, Pattern, Sequence, Set, TextIO, Tuple
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import SqlglotError
+except ImportError:
+    sqlglot = None
 
 from data_diff.databases import Database
 from data_diff.databases.mysql import MySQL
@@ -18,6 +34,299 @@ from data_diff.utils import getLogger
 
 logger = getLogger(__name__)
 
+# 预编译后的转换规则：(正则对象, 替换字符串)，按声明顺序依次应用
+CompiledRules = List[Tuple[Pattern, str]]
+
+# 可以写成内联形式 (?flags:...) 的正则标志
+_INLINE_FLAGS = ((re.ASCII, "a"), (re.IGNORECASE, "i"), (re.MULTILINE, "m"), (re.DOTALL, "s"), (re.VERBOSE, "x"))
+
+# 这些 ASCII 控制字符在 re 中属于 \s，而 Hyperscan 不认为它们是空白
+_PREFILTER_UNSAFE = re.compile(r"[\x1c-\x1f]")
+
+# 流式转换文件时每次读取的字符数
+_FILE_CHUNK_SIZE = 1 << 20
+
+# 语句切分时需要关注的记号：分号、引号和注释的开头
+_STATEMENT_TOKEN = re.compile(r"[;'\"`]|--|/\*")
+
+# 各类引号、注释对应的结尾（字符串中的反斜杠转义按 MySQL 的习惯处理）
+_TOKEN_END = {
+    "'": re.compile(r"(?:[^'\\]|\\.)*'", re.DOTALL),
+    '"': re.compile(r'(?:[^"\\]|\\.)*"', re.DOTALL),
+    "`": re.compile(r"[^`]*`"),
+    "--": re.compile(r"[^\n]*\n"),
+    "/*": re.compile(r".*?\*/", re.DOTALL),
+}
+
+# 单个字面字符（普通字符或转义的非字母数字字符）组成的正则
+_LITERAL_CHAR = re.compile(r"[^\\.^$*+?{}\[\]|()]|\\[^0-9A-Za-z]", re.DOTALL)
+# 替换模板中的分组引用（\1、\g<1>）以及转义的反斜杠
+_GROUP_REF = re.compile(r"\\(\d{1,2}|g<\d+>)|\\\\")
+
+
+def _compile_rules(rules: Dict[str, str]) -> CompiledRules:
+    """预编译规则字典，避免每次转换时重复解析正则"""
+    return [(re.compile(pattern, re.IGNORECASE), replacement) for pattern, replacement in rules.items()]
+
+
+def _inline_flags(pattern: Pattern) -> str:
+    """把编译时的标志写成作用域内联标志，使合并后的每条规则保留自己的标志"""
+    letters = "".join(letter for flag, letter in _INLINE_FLAGS if pattern.flags & flag)
+    return f"(?{letters}:{pattern.pattern})" if letters else f"(?:{pattern.pattern})"
+
+
+def _shift_group_refs(template: str, offset: int) -> str:
+    """将替换模板中的分组编号整体偏移 offset"""
+
+    def shift(m: Match) -> str:
+        ref = m.group(1)
+        if ref is None:
+            return m.group(0)
+        index = int(ref[2:-1]) if ref.startswith("g<") else int(ref)
+        return rf"\g<{index + offset}>"
+
+    return _GROUP_REF.sub(shift, template)
+
+
+def _char_rule(pattern: Pattern, replacement: str) -> Optional[Tuple[str, str]]:
+    """单个字面字符到固定文本的规则返回 (字符, 替换文本)，其余规则返回 None
+
+    忽略大小写的字母可能匹配多个字符，不作为单字符规则处理。
+    """
+    if pattern.flags & re.VERBOSE or "\\" in replacement or not _LITERAL_CHAR.fullmatch(pattern.pattern):
+        return None
+    char = pattern.pattern[-1]
+    if pattern.flags & re.IGNORECASE and char.lower() != char.upper():
+        return None
+    return char, replacement
+
+
+def _compile_prefilter(rules: CompiledRules) -> Optional["hyperscan.Database"]:
+    """用 Hyperscan 把所有规则编译成一个多模式 DFA，用来快速定位可能发生匹配的位置
+
+    Hyperscan 不支持的规则（VERBOSE 标志、非 ASCII 模式、可匹配空串等）
+    会使整个方言对退回纯 re 路径。
+    """
+    if hyperscan is None:
+        return None
+
+    expressions = []
+    flags = []
+    for pattern, _ in rules:
+        if pattern.flags & re.VERBOSE:
+            return None
+        try:
+            expressions.append(pattern.pattern.encode("ascii"))
+        except UnicodeEncodeError:
+            return None
+        hs_flags = hyperscan.HS_FLAG_SOM_LEFTMOST
+        if pattern.flags & re.IGNORECASE:
+            hs_flags |= hyperscan.HS_FLAG_CASELESS
+        if pattern.flags & re.MULTILINE:
+            hs_flags |= hyperscan.HS_FLAG_MULTILINE
+        if pattern.flags & re.DOTALL:
+            hs_flags |= hyperscan.HS_FLAG_DOTALL
+        flags.append(hs_flags)
+
+    database = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+    try:
+        database.compile(
+            expressions=expressions, ids=list(range(len(expressions))), elements=len(expressions), flags=flags
+        )
+    except hyperscan.error as e:
+        logger.debug("无法用 Hyperscan 编译转换规则，使用 re 匹配: %s", e)
+        return None
+    return database
+
+
+def _replace_char(char: str, replacement: str, sql: str) -> str:
+    return sql.replace(char, replacement)
+
+
+def _sequential(rules: Sequence[Tuple[Pattern, str]]) -> Callable[[str], str]:
+    """按声明顺序逐条应用规则，与逐条 re.sub 的结果完全一致
+
+    每条规则都是一次 C 实现的扫描，没有逐个匹配的 Python 回调；
+    单个字面字符的规则直接用 str.replace。
+    """
+    steps: List[Callable[[str], str]] = []
+    for pattern, replacement in rules:
+        char_rule = _char_rule(pattern, replacement)
+        if char_rule is None:
+            steps.append(partial(pattern.sub, replacement))
+        else:
+            steps.append(partial(_replace_char, *char_rule))
+
+    def apply(sql: str) -> str:
+        for step in steps:
+            sql = step(sql)
+        return sql
+
+    return apply
+
+
+class _FusedRules:
+    """一个方言对的全部规则，合并为一个交替正则，一次扫描完成所有替换
+
+    每条规则包在自己的分组里，匹配后根据 lastindex 找到对应的替换。
+    同一位置上排在前面的规则优先；已被替换的文本不会再被后续规则匹配。
+
+    单个字面字符的替换规则不进入正则，而是合并为一张 str.translate 表，
+    在正则扫描之前用一次 C 循环完成。
+
+    安装了 hyperscan 时，对纯 ASCII 的 SQL 先用 DFA 扫描一遍找出候选位置，
+    re 只在这些位置上运行；结果与纯 re 路径完全一致。
+
+    与逐条应用不同，前面规则替换出的文本不会再被后面的规则匹配，而且每个匹配
+    都要回调一次 Python，匹配密集时明显慢于逐条 re.sub。只有安装了 hyperscan
+    且匹配稀疏时才可能更快，因此只在 SQLTranslator(fused=True) 时使用。
+    """
+
+    def __init__(self, rules: CompiledRules):
+        self.char_table: Dict[int, str] = {}
+        regex_rules: CompiledRules = []
+        for pattern, replacement in rules:
+            char_rule = _char_rule(pattern, replacement)
+            if char_rule is None:
+                regex_rules.append((pattern, replacement))
+            else:
+                # 与合并正则一致，同一字符以排在前面的规则为准
+                self.char_table.setdefault(ord(char_rule[0]), char_rule[1])
+
+        alternatives = []
+        self._replacements: Dict[int, str] = {}
+        group_index = 1
+        for pattern, replacement in regex_rules:
+            alternatives.append(f"({_inline_flags(pattern)})")
+            # 规则内部的分组编号需要加上外层分组之前的偏移量
+            self._replacements[group_index] = _shift_group_refs(replacement, group_index)
+            group_index += 1 + pattern.groups
+
+        self.pattern = re.compile("|".join(alternatives)) if alternatives else None
+        self._prefilter = _compile_prefilter(regex_rules) if alternatives else None
+        # Hyperscan 的 scratch 不能在线程间共享
+        self._local = threading.local()
+
+    def specialize(self) -> Callable[[str], str]:
+        """返回只做本规则集实际需要的步骤的转换函数"""
+        if self._prefilter is None and not self.char_table:
+            # 最常见的情况：直接交给 re 的 C 实现扫描
+            return partial(self.pattern.sub, self.replace)
+        if self.pattern is None:
+            char_table = self.char_table
+            return lambda sql: sql.translate(char_table)
+        return self.sub
+
+    def replace(self, m: Match) -> str:
+        template = self._replacements[m.lastindex]
+        return m.expand(template) if "\\" in template else template
+
+    def sub(self, sql: str) -> str:
+        if self.char_table:
+            sql = sql.translate(self.char_table)
+        if self.pattern is None:
+            return sql
+        # 非 ASCII 文本的字节偏移与字符下标不一致，且 \b、忽略大小写的语义与 re 不同
+        if self._prefilter is None or not sql.isascii() or _PREFILTER_UNSAFE.search(sql):
+            return self.pattern.sub(self.replace, sql)
+        return self._sub_prefiltered(sql)
+
+    def _sub_prefiltered(self, sql: str) -> str:
+        scratch = getattr(self._local, "scratch", None)
+        if scratch is None:
+            scratch = self._local.scratch = hyperscan.Scratch(self._prefilter)
+
+        spans: List[Tuple[int, int]] = []
+
+        def on_match(_id, start, end, _flags, _context):
+            spans.append((start, end))
+
+        self._prefilter.scan(sql.encode("ascii"), match_event_handler=on_match, scratch=scratch)
+        if not spans:
+            return sql
+
+        # re 在位置 p 的任一匹配，都对应一个 start <= p < end 的 DFA 匹配，
+        # 因此可以直接跳到 max(start, pos) 的最小值处搜索，而不会漏掉匹配
+        spans.sort()
+        pieces = []
+        pos = 0
+        i = 0
+        max_end = -1
+        while True:
+            while i < len(spans) and spans[i][0] <= pos:
+                max_end = max(max_end, spans[i][1])
+                i += 1
+            if max_end > pos:
+                jump = pos
+            elif i < len(spans):
+                jump = spans[i][0]
+            else:
+                break
+
+            m = self.pattern.search(sql, jump)
+            if m is None:
+                break
+            pieces.append(sql[pos : m.start()])
+            pieces.append(self.replace(m))
+            pos = m.end()
+
+        pieces.append(sql[pos:])
+        return "".join(pieces)
+
+
+@lru_cache(maxsize=64)
+def _fuse(rules: Tuple[Tuple[Pattern, str], ...]) -> _FusedRules:
+    """合并规则集；相同的规则集在所有 SQLTranslator 实例间共享编译好的正则和 Hyperscan 数据库"""
+    return _FusedRules(list(rules))
+
+
+def _identity(sql: str) -> str:
+    return sql
+
+
+def _iter_statements(f: TextIO, chunk_size: int = _FILE_CHUNK_SIZE) -> Iterator[str]:
+    """从文本流中逐条读取 SQL 语句，引号和注释中的分号不作为语句结尾
+
+    每条语句包含结尾的分号，所有语句拼接起来与原文完全一致。
+    """
+    buf = ""
+    # 当前语句在 buf 中的起点；已输出的部分每读入一块才丢弃一次，避免每条语句都复制剩余内容
+    start = 0
+    scan = 0
+    eof = False
+    while True:
+        m = _STATEMENT_TOKEN.search(buf, scan)
+        if m is not None:
+            token = m.group()
+            if token == ";":
+                yield buf[start : m.end()]
+                start = scan = m.end()
+                continue
+
+            end = _TOKEN_END[token].match(buf, m.end())
+            if end is not None:
+                scan = end.end()
+                continue
+            # 引号或注释尚未闭合，读入更多内容后从记号开头重新匹配
+            resume = m.start()
+        else:
+            # 末尾的 '-' 或 '/' 可能是注释记号的前半部分
+            resume = max(len(buf) - 1, scan)
+
+        if eof:
+            break
+        chunk = f.read(chunk_size)
+        if chunk:
+            buf = buf[start:] + chunk
+            resume -= start
+            start = 0
+        else:
+            eof = True
+        scan = resume
+
+    if start < len(buf):
+        yield buf[start:]
+
 
 class DatabaseDialect(Enum):
     """数据库方言"""
@@ -31,29 +340,131 @@ class DatabaseDialect(Enum):
     @classmethod
     def from_database(cls, db: Database) -> "DatabaseDialect":
         """从数据库实例获取方言"""
-        if isinstance(db, MySQL):
-            return cls.MYSQL
-        elif isinstance(db, PostgreSQL):
-            return cls.POSTGRESQL
-        elif isinstance(db, Snowflake):
-            return cls.SNOWFLAKE
-        elif isinstance(db, Clickhouse):
-            return cls.CLICKHOUSE
-        else:
-            # 尝试从数据库名称推断
-            db_name = db.name.lower()
-            for dialect in cls:
-                if dialect.value in db_name:
-                    return dialect
-            raise ValueError(f"无法识别数据库方言: {type(db).__name__}")
+        return _DB_CLS_TO_DIALECT.get(type(db)) or _dialect_for_class(type(db))
+    
+    @classmethod
+    def from_url(cls, url: str) -> "DatabaseDialect":
+        """从连接字符串的 scheme 获取方言，无需建立数据库连接"""
+        scheme = urlparse(url).scheme
+        try:
+            return _SCHEME_TO_DIALECT[scheme]
+        except KeyError:
+            raise ValueError(f"无法从连接字符串识别数据库方言: {scheme or url}")
+
+
+# 数据库类型到方言的直接映射
+_DB_CLS_TO_DIALECT: Dict[type, DatabaseDialect] = {
+    MySQL: DatabaseDialect.MYSQL,
+    PostgreSQL: DatabaseDialect.POSTGRESQL,
+    Snowflake: DatabaseDialect.SNOWFLAKE,
+    Clickhouse: DatabaseDialect.CLICKHOUSE,
+}
+
+
+# 连接字符串 scheme 到方言的映射（与 data_diff.databases._connect 支持的 scheme 对应）
+_SCHEME_TO_DIALECT: Dict[str, DatabaseDialect] = {
+    "mysql": DatabaseDialect.MYSQL,
+    "postgresql": DatabaseDialect.POSTGRESQL,
+    "postgres": DatabaseDialect.POSTGRESQL,
+    "redshift": DatabaseDialect.POSTGRESQL,
+    "snowflake": DatabaseDialect.SNOWFLAKE,
+    "clickhouse": DatabaseDialect.CLICKHOUSE,
+    "oracle": DatabaseDialect.ORACLE,
+    "mssql": DatabaseDialect.MSSQL,
+}
+
+
+@lru_cache(maxsize=None)
+def _dialect_for_class(db_cls: type) -> DatabaseDialect:
+    """识别不在直接映射中的数据库类型（子类、其他数据库）"""
+    for base in db_cls.__mro__:
+        if base in _DB_CLS_TO_DIALECT:
+            return _DB_CLS_TO_DIALECT[base]
+    
+    # 尝试从数据库名称推断（Database.name 即类名）
+    return _infer_from_name(db_cls.__name__)
+
+
+# DatabaseDialect 对应的 sqlglot 方言名
+_SQLGLOT_DIALECTS = {
+    DatabaseDialect.MYSQL: "mysql",
+    DatabaseDialect.POSTGRESQL: "postgres",
+    DatabaseDialect.SNOWFLAKE: "snowflake",
+    DatabaseDialect.CLICKHOUSE: "clickhouse",
+    DatabaseDialect.ORACLE: "oracle",
+    DatabaseDialect.MSSQL: "tsql",
+}
+
+
+# 生成目标方言 SQL 时传给 sqlglot 的选项
+_SQLGLOT_GENERATE_OPTIONS = {"identify": True}
+
+
+@lru_cache(maxsize=1024)
+def _sqlglot_parse(sql: str, read: str) -> tuple:
+    """用 sqlglot 解析 SQL；同一条 SQL 转换到多个目标方言时只解析一次
+
+    生成 SQL 时 sqlglot 会复制语法树，缓存的语法树不会被修改。
+    """
+    return tuple(expression for expression in sqlglot.parse(sql, read=read) if expression is not None)
+
+
+def _strip_mysql_table_options(expression: "exp.Expression") -> "exp.Expression":
+    """移除只有 MySQL 支持的建表选项（ENGINE、AUTO_INCREMENT=、字符集、排序规则），与正则规则移除 ENGINE 一致"""
+    options = (exp.EngineProperty, exp.AutoIncrementProperty, exp.CharacterSetProperty, exp.CollateProperty)
+    if next(expression.find_all(*options), None) is None:
+        return expression
+    
+    # 缓存的语法树不能修改
+    expression = expression.copy()
+    for option in list(expression.find_all(*options)):
+        option.pop()
+    return expression
+
+
+def _infer_from_name(db_name: str) -> DatabaseDialect:
+    """从数据库名称推断方言"""
+    name = db_name.lower()
+    for dialect in DatabaseDialect:
+        if dialect.value in name:
+            return dialect
+    raise ValueError(f"无法识别数据库方言: {db_name}")
 
 
 class SQLTranslator:
-    """SQL 转换器"""
+    """SQL 转换器
     
-    def __init__(self):
+    默认按正则规则转换。legacy=False 时先用 sqlglot 把 SQL 解析为语法树，再按目标方言
+    生成，字符串字面量等内容不会被误改，但速度慢得多；sqlglot 无法解析的 SQL 退回
+    正则规则转换。sqlglot 是可选依赖（pip install data-diff[sqlglot]），是否安装
+    不会改变默认的转换结果。
+    
+    Args:
+        legacy: True（默认）时只使用正则规则；False 时使用 sqlglot（未安装时报错）。
+        fused: 把方言对的正则规则合并成一个交替正则一次扫描完成（见 _FusedRules）。
+            默认按声明顺序逐条应用；合并后前面规则替换出的文本不会再被后面的规则匹配，
+            结果可能不同。只有安装了 hyperscan 且规则匹配稀疏时合并才更快。
+    
+    conversion_rules 是 {(源方言, 目标方言): {正则: 替换字符串}}，可以直接修改；规则在内部编译，
+    编译结果和转换缓存按方言对规则的当前内容区分，修改后立即生效。
+    """
+    
+    def __init__(self, legacy: bool = True, fused: bool = False):
+        if not legacy and sqlglot is None:
+            raise ImportError("使用 sqlglot 转换 SQL 需要安装 sqlglot")
+        self.legacy = legacy
+        self.fused = fused
         self.conversion_rules: Dict[Tuple[DatabaseDialect, DatabaseDialect], Dict[str, str]] = {}
         self._init_conversion_rules()
+        # add_rule 追加的规则的正则；sqlglot 生成 SQL 后仍要应用这些规则
+        self._custom_patterns: Dict[Tuple[DatabaseDialect, DatabaseDialect], Set[str]] = {}
+        # 以下缓存都以方言对规则的快照（见 _rules_key）为键，规则被修改后自然失效。
+        # 每份规则只收集、编译、合并一次，只生成一次专用转换函数
+        self._collect_cached = lru_cache(maxsize=64)(self._collect_rules)
+        self._fuse_cached = lru_cache(maxsize=64)(self._fuse_rules)
+        self._specialize_cached = lru_cache(maxsize=64)(self._specialize)
+        # 转换结果只依赖 (sql, 源方言, 目标方言, 规则)，重复的语句直接命中缓存
+        self._translate_cached = lru_cache(maxsize=4096)(self._translate)
     
     def _init_conversion_rules(self) -> None:
         """初始化转换规则"""
@@ -90,42 +501,173 @@ class SQLTranslator:
     
     def translate(self, sql: str, source_dialect: DatabaseDialect, target_dialect: DatabaseDialect) -> str:
         """转换 SQL 语句"""
-        if source_dialect == target_dialect:
-            return sql
+        rules_key = self._rules_key(source_dialect, target_dialect)
+        return self._translate_cached(sql, source_dialect, target_dialect, rules_key)
+    
+    def translate_batch(self, sqls: Sequence[str], source_dialects: Sequence[DatabaseDialect],
+                        target_dialects: Sequence[DatabaseDialect]) -> List[str]:
+        """批量转换 SQL 语句，第 i 条语句从 source_dialects[i] 转换到 target_dialects[i]
+        
+        按方言对分组，每组只取一次转换函数；组内相同的语句只转换一次。
+        返回的结果与 sqls 顺序一致。
+        """
+        if not len(sqls) == len(source_dialects) == len(target_dialects):
+            raise ValueError("sqls、source_dialects 和 target_dialects 的长度必须一致")
         
-        rules = self.conversion_rules.get((source_dialect, target_dialect))
-        if not rules:
-            logger.warning(
-                f"未找到从 {source_dialect.value} 到 {target_dialect.value} 的转换规则，"
-                "返回原始 SQL"
+        groups: Dict[Tuple[DatabaseDialect, DatabaseDialect], List[int]] = {}
+        for i, pair in enumerate(zip(source_dialects, target_dialects)):
+            groups.setdefault(pair, []).append(i)
+        
+        results: List[str] = [""] * len(sqls)
+        for (source, target), indices in groups.items():
+            translate = self._get_specialized(source, target)
+            translated: Dict[str, str] = {}
+            for i in indices:
+                sql = sqls[i]
+                if sql not in translated:
+                    translated[sql] = translate(sql)
+                results[i] = translated[sql]
+        return results
+    
+    def add_rule(self, source_dialect: DatabaseDialect, target_dialect: DatabaseDialect,
+                 pattern: str, replacement: str) -> None:
+        """为方言对追加一条正则转换规则（忽略大小写），并使已缓存的转换结果失效
+        
+        使用 sqlglot 时，追加的规则在 sqlglot 生成目标 SQL 之后按追加顺序应用。
+        """
+        pair = (source_dialect, target_dialect)
+        self.conversion_rules.setdefault(pair, {})[pattern] = replacement
+        self._custom_patterns.setdefault(pair, set()).add(pattern)
+        # 同一条规则重复添加时快照不变，但 sqlglot 路径要应用的规则变了
+        self.clear_cache()
+    
+    def clear_cache(self) -> None:
+        """清空转换缓存，释放内存（修改 conversion_rules 后无需调用）"""
+        self._translate_cached.cache_clear()
+        self._collect_cached.cache_clear()
+        self._fuse_cached.cache_clear()
+        self._specialize_cached.cache_clear()
+    
+    def _rules_key(self, source: DatabaseDialect, target: DatabaseDialect) -> Tuple[Tuple[str, str], ...]:
+        """方言对当前规则的快照，作为编译结果和转换缓存的键"""
+        rules = self.conversion_rules.get((source, target))
+        return tuple(rules.items()) if rules else ()
+    
+    def _get_rules(self, source: DatabaseDialect,
+                   target: DatabaseDialect) -> Optional[Tuple[Tuple[Pattern, str], ...]]:
+        return self._collect_cached(source, target, self._rules_key(source, target))
+    
+    def _get_fused_rules(self, source: DatabaseDialect, target: DatabaseDialect) -> Optional[_FusedRules]:
+        return self._fuse_cached(source, target, self._rules_key(source, target))
+    
+    def _get_specialized(self, source: DatabaseDialect, target: DatabaseDialect) -> Callable[[str], str]:
+        return self._specialize_cached(source, target, self._rules_key(source, target))
+    
+    def rules_fingerprint(self, source_dialect: DatabaseDialect, target_dialect: DatabaseDialect) -> str:
+        """方言对当前规则集的指纹，规则变化时指纹随之变化，可作为持久化转换缓存键的一部分"""
+        rules = self._get_rules(source_dialect, target_dialect)
+        if rules is not None:
+            # 合并与逐条应用的结果可能不同，方式也是指纹的一部分
+            rules = (self.fused, [(pattern.pattern, pattern.flags, replacement) for pattern, replacement in rules])
+        if not self.legacy:
+            rules = (
+                "sqlglot", sqlglot.__version__, _SQLGLOT_DIALECTS[source_dialect], _SQLGLOT_DIALECTS[target_dialect],
+                sorted(_SQLGLOT_GENERATE_OPTIONS.items()), rules,
             )
+        return hashlib.blake2b(repr(rules).encode("utf-8"), digest_size=16).hexdigest()
+    
+    def _translate(self, sql: str, source_dialect: DatabaseDialect, target_dialect: DatabaseDialect,
+                   rules_key: Tuple[Tuple[str, str], ...]) -> str:
+        return self._specialize_cached(source_dialect, target_dialect, rules_key)(sql)
+    
+    def _specialize(self, source: DatabaseDialect, target: DatabaseDialect,
+                    rules_key: Tuple[Tuple[str, str], ...]) -> Callable[[str], str]:
+        """为方言对生成专用的转换函数，热路径上不再有方言判断和规则查找"""
+        if source == target:
+            return _identity
+        if not self.legacy:
+            custom_patterns = self._custom_patterns.get((source, target), ())
+            custom_rules = _compile_rules({
+                pattern: replacement for pattern, replacement in rules_key if pattern in custom_patterns
+            })
+            rewrite = _sequential(custom_rules) if custom_rules else None
+            fallback = self._specialize_rules(source, target, rules_key)
+            return partial(self._transpile, source=source, target=target, rewrite=rewrite, fallback=fallback)
+        return self._specialize_rules(source, target, rules_key)
+    
+    def _specialize_rules(self, source: DatabaseDialect, target: DatabaseDialect,
+                          rules_key: Tuple[Tuple[str, str], ...]) -> Callable[[str], str]:
+        """基于正则规则的转换函数"""
+        rules = self._collect_cached(source, target, rules_key)
+        if rules is None:
+            def passthrough(sql: str) -> str:
+                logger.warning("未找到从 %s 到 %s 的转换规则，返回原始 SQL", source.value, target.value)
+                return sql
+            return passthrough
+        
+        if self.fused:
+            return self._fuse_cached(source, target, rules_key).specialize()
+        return _sequential(rules)
+    
+    def _transpile(self, sql: str, source: DatabaseDialect, target: DatabaseDialect,
+                   rewrite: Optional[Callable[[str], str]], fallback: Callable[[str], str]) -> str:
+        """用 sqlglot 解析并按目标方言重新生成 SQL，保留首尾空白和结尾分号
+        
+        rewrite 是 add_rule 追加的规则，应用在生成的 SQL 上；解析失败时用 fallback（正则规则，
+        已包含追加的规则）转换。
+        """
+        try:
+            expressions = _sqlglot_parse(sql, _SQLGLOT_DIALECTS[source])
+        except SqlglotError as e:
+            logger.debug("sqlglot 无法解析 SQL，使用正则规则转换: %s", e)
+            return fallback(sql)
+        if not expressions:
             return sql
+        if source == DatabaseDialect.MYSQL:
+            expressions = [_strip_mysql_table_options(expression) for expression in expressions]
+        
+        write = _SQLGLOT_DIALECTS[target]
+        translated = ";\n".join(expression.sql(dialect=write, **_SQLGLOT_GENERATE_OPTIONS) for expression in expressions)
+        if rewrite is not None:
+            translated = rewrite(translated)
         
-        translated = sql
-        for pattern, replacement in rules.items():
-            translated = re.sub(pattern, replacement, translated, flags=re.IGNORECASE)
+        body = sql.strip()
+        start = sql.index(body)
+        if body.endswith(";"):
+            translated += ";"
+        return sql[:start] + translated + sql[start + len(body):]
+    
+    def _collect_rules(self, source: DatabaseDialect, target: DatabaseDialect,
+                       rules_key: Tuple[Tuple[str, str], ...]) -> Optional[Tuple[Tuple[Pattern, str], ...]]:
+        """编译方言对的转换规则并加上通用转换规则，按应用顺序排列；没有方言对规则时返回 None"""
+        if not rules_key:
+            return None
         
-        # 通用转换
-        translated = self._apply_common_transformations(translated, source_dialect, target_dialect)
+        return tuple(_compile_rules(dict(rules_key)) + self._compile_common_rules(source, target))
+    
+    def _fuse_rules(self, source: DatabaseDialect, target: DatabaseDialect,
+                    rules_key: Tuple[Tuple[str, str], ...]) -> Optional[_FusedRules]:
+        """合并方言对的全部规则"""
+        rules = self._collect_cached(source, target, rules_key)
+        if rules is None:
+            return None
         
-        return translated
+        return _fuse(rules)
     
-    def _apply_common_transformations(self, sql: str, source: DatabaseDialect, target: DatabaseDialect) -> str:
-        """应用通用转换规则"""
+    def _compile_common_rules(self, source: DatabaseDialect, target: DatabaseDialect) -> CompiledRules:
+        """编译数据类型和函数名映射规则"""
+        rules = {}
+        
         # 数据类型转换
-        type_mappings = self._get_type_mappings(source, target)
-        for source_type, target_type in type_mappings.items():
+        for source_type, target_type in self._get_type_mappings(source, target).items():
             # 简单的类型替换（实际应该更智能）
-            pattern = rf"\b{source_type}\b"
-            sql = re.sub(pattern, target_type, sql, flags=re.IGNORECASE)
+            rules[rf"\b{source_type}\b"] = target_type
         
         # 函数名转换
-        function_mappings = self._get_function_mappings(source, target)
-        for source_func, target_func in function_mappings.items():
-            pattern = rf"\b{source_func}\s*\("
-            sql = re.sub(pattern, f"{target_func}(", sql, flags=re.IGNORECASE)
+        for source_func, target_func in self._get_function_mappings(source, target).items():
+            rules[rf"\b{source_func}\s*\("] = f"{target_func}("
         
-        return sql
+        return _compile_rules(rules)
     
     def _get_type_mappings(self, source: DatabaseDialect, target: DatabaseDialect) -> Dict[str, str]:
         """获取数据类型映射"""
@@ -167,14 +709,14 @@ class SQLTranslator:
     
     def translate_file(self, input_file: str, output_file: str, 
                       source_dialect: DatabaseDialect, target_dialect: DatabaseDialect) -> None:
-        """转换 SQL 文件"""
-        with open(input_file, 'r', encoding='utf-8') as f:
-            sql = f.read()
-        
-        translated = self.translate(sql, source_dialect, target_dialect)
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(translated)
+        """转换 SQL 文件
+
+        逐条语句读取、转换并写出，不会把整个文件读入内存；重复的语句直接命中转换缓存。
+        """
+        with open(input_file, 'r', encoding='utf-8', buffering=_FILE_CHUNK_SIZE) as src, \
+                open(output_file, 'w', encoding='utf-8', buffering=_FILE_CHUNK_SIZE) as dst:
+            for statement in _iter_statements(src):
+                dst.write(self.translate(statement, source_dialect, target_dialect))
         
-        logger.info(f"已转换 SQL 文件: {input_file} -> {output_file}")
+        logger.info("已转换 SQL 文件: %s -> %s", input_file, output_file)
 
@@ -5,17 +5,205 @@ MigrationValidator - 迁移验证器
 """
 
 import logging
-from typing import Dict, Any, Optional, Tuple
+import math
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from statistics import NormalDist
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 
-from data_diff import connect_to_table, diff_tables, Algorithm
+from data_diff import connect, diff_tables, Algorithm
+from data_diff.databases import Database
+from data_diff.databases.base import CHECKSUM_MASK, CHECKSUM_OFFSET
 from data_diff.diff_tables import DiffResultWrapper
+from data_diff.queries.api import Code, Count
+from data_diff.table_segment import TableSegment
 from data_diff.utils import getLogger
 
 logger = getLogger(__name__)
 
+# 批量验证默认的最大并发数
+DEFAULT_BATCH_WORKERS = 8
+# 每个验证器缓存的数据库连接数
+CONNECTION_CACHE_SIZE = 64
+
+
+def _close_database(database: Database) -> None:
+    """关闭不再使用的数据库连接；连接已经断开时关闭可能出错，忽略即可"""
+    try:
+        database.close()
+    except Exception as e:
+        logger.debug("关闭数据库连接时出错: %s", e)
+
+
+def _wilson_upper_bound(diff_count: int, sample_rows: int, confidence: float) -> float:
+    """差异比例的 Wilson 置信区间上界（0~1）"""
+    if sample_rows <= 0:
+        return 0.0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    p = diff_count / sample_rows
+    denominator = 1 + z * z / sample_rows
+    center = p + z * z / (2 * sample_rows)
+    margin = z * math.sqrt(p * (1 - p) / sample_rows + z * z / (4 * sample_rows * sample_rows))
+    return min(1.0, (center + margin) / denominator)
+
+
+def _sample_predicate(table: TableSegment, start: int, width: int) -> str:
+    """主键 md5 散列值落在 [start, start + width)（超出值域时回绕）的行
+    
+    散列值与数据库无关，两边选出的是同一组主键；散列均匀分布，每行是否入选相互独立。
+    """
+    dialect = table.database.dialect
+    key_hash = dialect.md5_as_int(dialect.to_string(dialect.quote(table.key_columns[0])))
+    # md5_as_int 的值域为 [-CHECKSUM_OFFSET, CHECKSUM_MASK - CHECKSUM_OFFSET]
+    low = start - CHECKSUM_OFFSET
+    high = low + width
+    top = CHECKSUM_MASK - CHECKSUM_OFFSET + 1
+    if high <= top:
+        return f"{key_hash} >= {low} AND {key_hash} < {high}"
+    return f"{key_hash} >= {low} OR {key_hash} < {high - (CHECKSUM_MASK + 1)}"
+
+
+def _has_rows(table: TableSegment) -> bool:
+    """表中是否有行；LIMIT 1 探测，找到一行即返回，不扫描全表"""
+    return bool(table.database.query(table.make_select().select(Code("1")).limit(1), list))
+
+
+def _count_with_sample(table: TableSegment, predicate: str) -> Tuple[int, int]:
+    """一次扫描同时统计全表行数和满足抽样条件的行数"""
+    select = table.make_select().select(Count(), Count(Code(f"CASE WHEN ({predicate}) THEN 1 END")))
+    total, sampled = table.database.query(select, tuple)
+    return total, sampled
+
+
+def _empty_side_stats(source_rows: int, target_rows: int) -> Dict[str, Any]:
+    """至少一边为空时的差异统计，格式与 get_stats_dict() 一致"""
+    return {
+        "rows_A": source_rows,
+        "rows_B": target_rows,
+        "exclusive_A": source_rows,
+        "exclusive_B": target_rows,
+        "updated": 0,
+        "unchanged": 0,
+        "total": source_rows + target_rows,
+        "stats": {},
+        "values": {},
+    }
+
 
 class MigrationValidator:
-    """迁移验证器"""
+    """迁移验证器
+    
+    验证器缓存数据库连接，重复验证同一数据库（批量验证、定期重试）时不再重新建立连接。
+    连接由验证器独占，不再使用时调用 close() 关闭，或者在 with 语句中使用验证器；
+    验证出错时关闭该次验证用到的连接，下次验证重新连接。
+    
+    Args:
+        connection_cache_size: 最多缓存的连接数，超出时关闭最久未使用的连接
+    """
+    
+    def __init__(self, connection_cache_size: int = CONNECTION_CACHE_SIZE):
+        self.connection_cache_size = connection_cache_size
+        self._init_connections()
+    
+    def _init_connections(self) -> None:
+        # (连接串, 线程数) -> 数据库连接，按 LRU 缓存
+        self._connections: "OrderedDict[Tuple[str, int], Database]" = OrderedDict()
+        self._connections_lock = threading.Lock()
+        # id(数据库连接) -> 正在进行的验证中使用它的次数；移出缓存的连接等使用结束后再关闭
+        self._leases: Dict[int, int] = {}
+        self._retired: Dict[int, Database] = {}
+    
+    def __enter__(self) -> "MigrationValidator":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        # 进程池批量验证时验证器会被序列化，连接和锁不能跨进程，子进程使用自己的连接
+        return {"connection_cache_size": self.connection_cache_size}
+    
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.connection_cache_size = state["connection_cache_size"]
+        self._init_connections()
+    
+    def close(self) -> None:
+        """关闭缓存的全部数据库连接"""
+        self.clear_connections()
+    
+    def clear_connections(self, database: Optional[str] = None) -> None:
+        """关闭缓存的数据库连接，指定 database 时只关闭该连接串的连接；正在验证中使用的连接在验证结束后关闭"""
+        with self._connections_lock:
+            keys = [key for key in self._connections if database in (None, key[0])]
+            evicted = [self._connections.pop(key) for key in keys]
+        self._retire(evicted)
+    
+    def _connect_table(self, leases: List[Database], database: str, table_name: str,
+                       key_columns: Tuple[str, ...], thread_count: int = 1, **kwargs) -> TableSegment:
+        """与 connect_to_table 相同，但复用缓存的数据库连接；借用的连接记录在 leases 中"""
+        key = (database, thread_count)
+        evicted = []
+        with self._connections_lock:
+            db = self._connections.get(key)
+            if db is None or db.is_closed:
+                db = None
+            else:
+                self._connections.move_to_end(key)
+                self._lease(leases, db)
+        
+        if db is None:
+            # 在锁外连接数据库，避免阻塞其他验证
+            db = connect(database, thread_count=thread_count, shared=False)
+            with self._connections_lock:
+                cached = self._connections.get(key)
+                if cached is not None and not cached.is_closed:
+                    # 其他线程同时连接了同一个数据库，使用先缓存的连接
+                    evicted.append(db)
+                    db = cached
+                else:
+                    self._connections[key] = db
+                self._connections.move_to_end(key)
+                self._lease(leases, db)
+                while len(self._connections) > self.connection_cache_size:
+                    evicted.append(self._connections.popitem(last=False)[1])
+        self._retire(evicted)
+        
+        return TableSegment(db, db.dialect.parse_table_name(table_name), key_columns, **kwargs)
+    
+    def _lease(self, leases: List[Database], database: Database) -> None:
+        """记录验证借用了该连接（调用方需持有 _connections_lock）"""
+        leases.append(database)
+        self._leases[id(database)] = self._leases.get(id(database), 0) + 1
+    
+    def _retire(self, databases: Iterable[Database]) -> None:
+        """关闭移出缓存的连接，仍在验证中使用的连接等使用结束后再关闭"""
+        to_close = []
+        with self._connections_lock:
+            for database in databases:
+                if self._leases.get(id(database)):
+                    self._retired[id(database)] = database
+                else:
+                    to_close.append(database)
+        for database in to_close:
+            _close_database(database)
+    
+    def _release(self, leases: List[Database]) -> None:
+        """验证结束，归还借用的连接"""
+        to_close = []
+        with self._connections_lock:
+            for database in leases:
+                remaining = self._leases[id(database)] - 1
+                if remaining:
+                    self._leases[id(database)] = remaining
+                    continue
+                del self._leases[id(database)]
+                retired = self._retired.pop(id(database), None)
+                if retired is not None:
+                    to_close.append(retired)
+        for database in to_close:
+            _close_database(database)
     
     def validate(self,
                  source_database: str,
@@ -25,7 +213,10 @@ class MigrationValidator:
                  key_columns: Tuple[str, ...] = ("id",),
                  update_column: Optional[str] = None,
                  extra_columns: Tuple[str, ...] = (),
-                 threshold: float = 0.0) -> Dict[str, Any]:
+                 threshold: float = 0.0,
+                 sample_size: Optional[int] = None,
+                 sample_confidence: float = 0.95,
+                 threads: int = 1) -> Dict[str, Any]:
         """
         验证迁移结果
         
@@ -38,61 +229,126 @@ class MigrationValidator:
             update_column: 更新时间列
             extra_columns: 额外比较的列
             threshold: 允许的差异百分比阈值（0.0 表示不允许任何差异）
+            sample_size: 抽样行数（约数）。为 None 时比较全表，只有显式指定时才抽样
+            sample_confidence: 抽样时差异比例置信区间的置信度
+            threads: 每个数据库连接的线程数，也是 hashdiff 并发计算分段校验和的线程数。
+                校验和在数据库端计算，大表适当调大可以让多个分段的查询并行执行
+        
+        抽样只支持单列主键：按主键 md5 散列值随机选取约 sample_size 行，每行是否入选
+        相互独立，集中在某一段主键上的差异（例如漏迁移的尾部数据）也会按比例被抽到。
+        主键转为字符串后在两边必须一致（整数、字符串主键）。验证时用差异比例置信区间的
+        上界与阈值比较，以保证通过验证的结论仍然可靠。阈值为 0 时无法通过抽样证明
+        没有差异，因此不会抽样。
         
         Returns:
-            验证结果字典，包含 success, diff_count, diff_percent, stats 等
+            验证结果字典，包含 success, diff_count, diff_percent, stats 等。
+            row_count_source/row_count_target 始终是全表行数；抽样时 sample_rows_source/
+            sample_rows_target 是样本行数，diff_count、diff_percent 基于样本计算。
+            stats 为 get_stats_dict() 格式的差异统计（普通字典，可以直接序列化为 JSON）
+        
+        表是否为空用 LIMIT 1 探测；只有存在差异、需要抽样或一边为空时才执行 COUNT(*) 统计全表行数，
+        两边一致的全表比较不额外扫描。
         """
         logger.info(f"开始验证迁移: {source_table} -> {target_table}")
         
+        leases: List[Database] = []
         try:
             # 连接到两个表
-            table1 = connect_to_table(
+            table1 = self._connect_table(
+                leases,
                 source_database,
                 source_table,
-                key_columns,
+                tuple(key_columns),
+                thread_count=threads,
                 update_column=update_column,
-                extra_columns=extra_columns
+                extra_columns=tuple(extra_columns)
             )
             
-            table2 = connect_to_table(
+            table2 = self._connect_table(
+                leases,
                 target_database,
                 target_table,
-                key_columns,
+                tuple(key_columns),
+                thread_count=threads,
                 update_column=update_column,
-                extra_columns=extra_columns
-            )
-            
-            # 执行差异比较
-            diff_result: DiffResultWrapper = diff_tables(
-                table1,
-                table2,
-                algorithm=Algorithm.HASHDIFF,  # 跨数据库使用 hashdiff
-                extra_columns=extra_columns
+                extra_columns=tuple(extra_columns)
             )
             
-            # 获取统计信息
-            stats = diff_result.get_stats_dict()
-            
-            diff_count = stats.get("total", 0)
-            row_count1 = stats.get("rows_A", 0)
-            row_count2 = stats.get("rows_B", 0)
+            source_empty = not _has_rows(table1)
+            target_empty = not _has_rows(table2)
+            sampled = False
+            if source_empty or target_empty:
+                # 任一边为空时另一边的行全部是差异，无需比较，只统计非空一边的行数
+                source_rows = 0 if source_empty else table1.count()
+                target_rows = 0 if target_empty else table2.count()
+                row_count1, row_count2 = source_rows, target_rows
+                diff_count = source_rows + target_rows
+                stats = _empty_side_stats(source_rows, target_rows)
+            else:
+                source_rows = sample_width = None
+                if self._can_sample(table1, threshold, sample_size):
+                    # 抽样比例取决于源表行数
+                    source_rows = table1.count()
+                    sample_width = self._choose_sample_width(sample_size, source_rows)
+                if sample_width:
+                    sampled = True
+                    start = random.randrange(CHECKSUM_MASK + 1)
+                    predicate = _sample_predicate(table2, start, sample_width)
+                    target_rows, row_count2 = _count_with_sample(table2, predicate)
+                    table1 = table1.new(where=_sample_predicate(table1, start, sample_width))
+                    table2 = table2.new(where=predicate)
+                
+                # 执行差异比较
+                diff_result: DiffResultWrapper = diff_tables(
+                    table1,
+                    table2,
+                    algorithm=Algorithm.HASHDIFF,  # 跨数据库使用 hashdiff
+                    extra_columns=extra_columns,
+                    max_threadpool_size=threads,
+                )
+                
+                # 差异行边读取边统计，不保存在内存中
+                stats = diff_result.get_stats_dict(keep_rows=False)
+                diff_count = stats["total"]
+                
+                # hashdiff 统计的行数只覆盖比较过的分段（两边主键范围不同时会少算），不能直接使用。
+                # 主键唯一，目标表行数 = 源表行数 - 只在源表的行 + 只在目标表的行
+                if sampled:
+                    row_count1 = row_count2 + stats["exclusive_A"] - stats["exclusive_B"]
+                elif diff_count:
+                    if source_rows is None:
+                        source_rows = table1.count()
+                    row_count1 = source_rows
+                    target_rows = row_count2 = source_rows - stats["exclusive_A"] + stats["exclusive_B"]
+                else:
+                    # 没有差异时两边主键相同，hashdiff 统计的行数是准确的
+                    source_rows = target_rows = row_count1 = row_count2 = stats["rows_A"]
             
             # 计算差异百分比
             max_rows = max(row_count1, row_count2) if (row_count1 or row_count2) else 1
             diff_percent = (diff_count / max_rows * 100) if max_rows > 0 else 0.0
             
-            # 判断是否通过验证
-            success = diff_percent <= threshold
+            # 判断是否通过验证（抽样时使用置信区间上界）
+            if sampled:
+                diff_percent_upper = _wilson_upper_bound(diff_count, max_rows, sample_confidence) * 100
+                success = diff_percent_upper <= threshold
+            else:
+                success = diff_percent <= threshold
             
             result = {
                 "success": success,
                 "diff_count": diff_count,
                 "diff_percent": diff_percent,
-                "row_count_source": row_count1,
-                "row_count_target": row_count2,
+                "row_count_source": source_rows,
+                "row_count_target": target_rows,
                 "threshold": threshold,
-                "stats": stats
+                "stats": stats,
+                "sampled": sampled
             }
+            if sampled:
+                result["sample_rows_source"] = row_count1
+                result["sample_rows_target"] = row_count2
+                result["diff_percent_upper"] = diff_percent_upper
             
             if not success:
                 result["error"] = (
@@ -109,31 +365,71 @@ class MigrationValidator:
             
         except Exception as e:
             logger.error(f"验证迁移时出错: {e}", exc_info=True)
+            # 错误可能来自断开的连接（ThreadedDatabase 不会自动重连），下次验证重新连接
+            self.clear_connections(source_database)
+            self.clear_connections(target_database)
             return {
                 "success": False,
                 "error": str(e)
             }
+        finally:
+            self._release(leases)
+    
+    def _can_sample(self, table: TableSegment, threshold: float, sample_size: Optional[int]) -> bool:
+        """是否可以抽样验证"""
+        if sample_size is None:
+            return False
+        if threshold <= 0:
+            logger.warning("阈值为 0 时无法通过抽样验证，将比较全表")
+            return False
+        if len(table.key_columns) != 1:
+            logger.info("抽样仅支持单列主键，将比较全表")
+            return False
+        return True
+    
+    def _choose_sample_width(self, sample_size: int, row_count: int) -> Optional[int]:
+        """抽样时散列值区间的宽度，表行数不超过抽样行数时返回 None"""
+        if row_count <= sample_size:
+            return None
+        
+        logger.info(f"按主键散列随机抽样约 {sample_size}/{row_count} 行")
+        return max(1, math.ceil((CHECKSUM_MASK + 1) * sample_size / row_count))
     
-    def validate_batch(self, validations: list) -> Dict[str, Any]:
+    def validate_batch(self, validations: list,
+                       max_workers: Optional[int] = None,
+                       use_processes: bool = False) -> Dict[str, Any]:
         """
         批量验证多个迁移任务
         
+        各验证任务相互独立，主要耗时在等待数据库返回，因此默认使用线程池并发执行。
+        
         Args:
             validations: 验证配置列表，每个元素包含 validate() 方法的参数
+            max_workers: 最大并发数，默认 min(DEFAULT_BATCH_WORKERS, 任务数)
+            use_processes: 使用进程池执行（适合本地校验和计算占用 CPU 的场景）
         
         Returns:
-            批量验证结果
+            批量验证结果，results 顺序与 validations 一致
         """
-        results = []
         total = len(validations)
-        passed = 0
+        results: list = [None] * total
+        if not total:
+            return {"total": 0, "passed": 0, "failed": 0, "results": results}
+        
+        workers = max_workers or min(DEFAULT_BATCH_WORKERS, total)
+        executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
         
-        for i, validation_config in enumerate(validations, 1):
-            logger.info(f"验证进度: {i}/{total}")
-            result = self.validate(**validation_config)
-            results.append(result)
-            if result["success"]:
-                passed += 1
+        with executor_cls(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self.validate, **validation_config): i
+                for i, validation_config in enumerate(validations)
+            }
+            # 只在当前线程汇总结果，计数无需加锁
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                logger.info(f"验证进度: {done}/{total}")
+        
+        passed = sum(1 for result in results if result["success"])
         
         return {
             "total": total,
@@ -141,4 +437,3 @@ class MigrationValidator:
             "failed": total - passed,
             "results": results
         }
-
@@ -3,11 +3,11 @@ Migration Agent CLI - 迁移代理命令行接口
 """
 
 import click
-import json
 import uuid
 from typing import Optional
 
 from data_diff.migration import MigrationAgent, MigrationTask, MigrationStatus
+from data_diff.migration.agent import DEFAULT_STATE_PATH, DEFAULT_TRANSLATION_CACHE_DIR, progress_to_json
 from data_diff.utils import getLogger
 
 logger = getLogger(__name__)
@@ -35,7 +35,7 @@ def migration_cli():
 def create(source_db, source_table, target_db, target_table, key_columns, update_column,
           extra_columns, sql_file, sql_statement, validate, threshold, description):
     """创建迁移任务"""
-    agent = MigrationAgent()
+    agent = MigrationAgent(DEFAULT_STATE_PATH)
     
     task = MigrationTask(
         task_id=str(uuid.uuid4()),
@@ -61,7 +61,7 @@ def create(source_db, source_table, target_db, target_table, key_columns, update
 @click.option("--task-id", required=True, help="任务 ID")
 def execute(task_id):
     """执行迁移任务"""
-    agent = MigrationAgent()
+    agent = MigrationAgent(DEFAULT_STATE_PATH, DEFAULT_TRANSLATION_CACHE_DIR)
     progress = agent.execute_migration(task_id)
     
     if progress.status == MigrationStatus.COMPLETED:
@@ -76,15 +76,23 @@ def execute(task_id):
 
 @migration_cli.command()
 @click.option("--task-id", required=True, help="任务 ID")
-def status(task_id):
+@click.option("--json", "as_json", is_flag=True, help="以 JSON 输出完整进度（包含转换结果和验证统计）")
+def status(task_id, as_json):
     """查看迁移任务状态"""
-    agent = MigrationAgent()
+    agent = MigrationAgent(DEFAULT_STATE_PATH)
     progress = agent.get_progress(task_id)
     
     if not progress:
         click.echo(f"✗ 任务 {task_id} 不存在")
         return
     
+    if as_json:
+        translations = agent.get_translations(task_id)
+        if translations is not None:
+            progress.stats["translated_sqls"] = translations
+        click.echo(progress_to_json(progress))
+        return
+    
     click.echo(f"任务 ID: {task_id}")
     click.echo(f"状态: {progress.status.value}")
     click.echo(f"进度: {progress.progress_percent:.1f}%")
@@ -101,7 +109,7 @@ def status(task_id):
 @click.option("--task-id", required=True, help="任务 ID")
 def cancel(task_id):
     """取消迁移任务"""
-    agent = MigrationAgent()
+    agent = MigrationAgent(DEFAULT_STATE_PATH)
     if agent.cancel_task(task_id):
         click.echo(f"✓ 已取消任务: {task_id}")
     else:
@@ -119,15 +127,15 @@ def validate(source_db, source_table, target_db, target_table, key_columns, thre
     """验证迁移结果"""
     from data_diff.migration.validator import MigrationValidator
     
-    validator = MigrationValidator()
-    result = validator.validate(
-        source_database=source_db,
-        source_table=source_table,
-        target_database=target_db,
-        target_table=target_table,
-        key_columns=tuple(key_columns),
-        threshold=threshold
-    )
+    with MigrationValidator() as validator:
+        result = validator.validate(
+            source_database=source_db,
+            source_table=source_table,
+            target_database=target_db,
+            target_table=target_table,
+            key_columns=tuple(key_columns),
+            threshold=threshold
+        )
     
     if result["success"]:
         click.echo(f"✓ 验证通过")
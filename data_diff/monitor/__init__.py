@@ -4,7 +4,7 @@ DataMonitor - 数据监控模块
 提供数据质量监控、告警和调度功能
 """
 
-from data_diff.monitor.monitor import DataMonitor, MonitorRule, MonitorResult
+from data_diff.monitor.monitor import DataMonitor, MonitorRule, MonitorResult, MonitorType, RuleOperator
 from data_diff.monitor.scheduler import MonitorScheduler
 from data_diff.monitor.alert import AlertManager, AlertChannel
 
@@ -12,6 +12,8 @@ __all__ = [
     "DataMonitor",
     "MonitorRule",
     "MonitorResult",
+    "MonitorType",
+    "RuleOperator",
     "MonitorScheduler",
     "AlertManager",
     "AlertChannel",
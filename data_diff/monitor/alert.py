@@ -6,7 +6,12 @@ AlertManager - 告警管理器
 
 import logging
 import json
-from typing import Dict, List, Optional, Any
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Callable, Deque, Dict, List, Optional, Any, Tuple
 from enum import Enum
 from dataclasses import dataclass, field
 import smtplib
@@ -15,15 +20,84 @@ from email.mime.multipart import MIMEMultipart
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except ImportError:
     requests = None
     logging.warning("requests is not installed. Webhook/Slack/Dingtalk alerts will not work.")
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from data_diff.monitor.monitor import MonitorRule, MonitorResult
 from data_diff.utils import getLogger
 
 logger = getLogger(__name__)
 
+# HTTP 告警默认的 (连接, 读取) 超时秒数
+DEFAULT_HTTP_TIMEOUT = (3.05, 10)
+# 保留的最近告警记录数
+MAX_ALERT_HISTORY = 1000
+# 后台发送 HTTP 告警的线程数
+HTTP_ALERT_WORKERS = 4
+
+
+def _create_session() -> "requests.Session":
+    """创建复用 TCP/TLS 连接的 HTTP 会话，网关错误时自动重试"""
+    retry = Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["POST"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _encode_json(data: Dict[str, Any]) -> bytes:
+    """编码为 UTF-8 JSON；安装了 orjson 时使用 orjson
+    
+    orjson 默认拒绝非字符串键，也不支持超过 64 位的整数，这些情况退回 json 模块，结果与 json.dumps 一致。
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def _get_stats_json(result: MonitorResult) -> str:
+    """result.stats 的缩进 JSON 文本，同一结果只序列化一次"""
+    if result._stats_json is None:
+        result._stats_json = json.dumps(result.stats, indent=2, ensure_ascii=False)
+    return result._stats_json
+
+
+def _message_fields(rule: MonitorRule, result: MonitorResult) -> List[Tuple[str, str]]:
+    """告警消息中的 (字段名, 值) 列表"""
+    return [
+        ("规则名称", rule.name),
+        ("差异数量", str(result.diff_count)),
+        ("差异百分比", f"{result.diff_percent:.2f}%"),
+        ("表1行数", str(result.row_count_table1)),
+        ("表2行数", str(result.row_count_table2)),
+        ("时间", str(result.timestamp)),
+    ]
+
+
+def _log_send_error(channel: "AlertChannel", future: Future) -> None:
+    """后台发送完成后记录未处理的异常"""
+    e = future.exception()
+    if e is not None:
+        logger.error(f"发送告警到 {channel.value} 时出错: {e}", exc_info=e)
+
 
 class AlertChannel(Enum):
     """告警渠道类型"""
@@ -34,6 +108,10 @@ class AlertChannel(Enum):
     DINGTALK = "dingtalk"  # 钉钉
 
 
+# 告警处理函数：(规则, 结果, 告警记录, 渠道配置)
+AlertHandler = Callable[[MonitorRule, MonitorResult, Dict[str, Any], Dict[str, Any]], None]
+
+
 @dataclass
 class AlertConfig:
     """告警配置"""
@@ -44,11 +122,46 @@ class AlertConfig:
 
 
 class AlertManager:
-    """告警管理器"""
+    """告警管理器
+    
+    渠道保存在 channels 中，可以通过 add_channel/remove_channel 修改，也可以直接增删 channels 的条目；
+    发送时按 channels 当前的内容分发。
+    """
     
     def __init__(self):
         self.channels: Dict[AlertChannel, AlertConfig] = {}
-        self.alert_history: List[Dict[str, Any]] = []
+        # 超出容量时自动丢弃最旧的记录
+        self.alert_history: Deque[Dict[str, Any]] = deque(maxlen=MAX_ALERT_HISTORY)
+        # Webhook/Slack/钉钉告警共用一个会话，重复发送时复用连接
+        self._session = _create_session() if requests is not None else None
+        # HTTP 告警在后台线程中并行发送，慢的渠道不会阻塞其他渠道和调度线程
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # 已登录的 SMTP 连接按 (主机, 端口, 用户) 复用；连接不能并发使用，发送时持有锁
+        self._smtp_pool: Dict[Tuple[str, int, Optional[str]], smtplib.SMTP] = {}
+        self._smtp_lock = threading.Lock()
+        # (channels 条目快照, [(渠道, 配置, 处理函数)])，channels 变化后发送时重建，发送时无需逐个比较渠道类型
+        self._dispatch: Tuple[Tuple[Tuple[AlertChannel, AlertConfig], ...],
+                              List[Tuple[AlertChannel, AlertConfig, AlertHandler]]] = ((), [])
+        self._handlers: Dict[AlertChannel, AlertHandler] = {
+            AlertChannel.LOG: self._send_log_alert,
+            AlertChannel.EMAIL: self._send_email_alert,
+            AlertChannel.WEBHOOK: self._submit_webhook_alert,
+            AlertChannel.SLACK: self._submit_slack_alert,
+            AlertChannel.DINGTALK: self._submit_dingtalk_alert,
+        }
+    
+    def close(self) -> None:
+        """等待后台告警发送完成，并关闭 HTTP 会话（之后仍可继续发送告警）"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if self._session is not None:
+            self._session.close()
+        with self._smtp_lock:
+            for key in list(self._smtp_pool):
+                self._discard_smtp(key)
     
     def add_channel(self, channel: AlertChannel, config: Optional[Dict[str, Any]] = None) -> None:
         """添加告警渠道"""
@@ -57,13 +170,26 @@ class AlertManager:
             enabled=True,
             config=config or {}
         )
-        logger.info(f"添加告警渠道: {channel.value}")
+        logger.info("添加告警渠道: %s", channel.value)
     
     def remove_channel(self, channel: AlertChannel) -> None:
         """移除告警渠道"""
         if channel in self.channels:
             del self.channels[channel]
-            logger.info(f"移除告警渠道: {channel.value}")
+            logger.info("移除告警渠道: %s", channel.value)
+    
+    def _get_dispatch(self) -> List[Tuple[AlertChannel, AlertConfig, AlertHandler]]:
+        """channels 对应的处理函数列表，channels 的条目变化时重建"""
+        snapshot = tuple(self.channels.items())
+        cached_snapshot, dispatch = self._dispatch
+        if len(snapshot) != len(cached_snapshot) or any(
+            channel is not cached_channel or config is not cached_config
+            for (channel, config), (cached_channel, cached_config) in zip(snapshot, cached_snapshot)
+        ):
+            dispatch = [(channel_type, config, self._handlers[channel_type]) for channel_type, config in snapshot]
+            # 快照和处理函数列表一起替换，并发发送时不会读到不一致的组合
+            self._dispatch = (snapshot, dispatch)
+        return dispatch
     
     def send_alert(self, rule: MonitorRule, result: MonitorResult) -> None:
         """发送告警"""
@@ -81,42 +207,83 @@ class AlertManager:
             "error": result.error
         }
         
-        # 记录告警历史
+        # 记录告警历史；deque.append 本身是原子操作，并发发送告警时无需加锁，
+        # 读取方 get_alert_history 也能立即看到刚记录的告警
         self.alert_history.append(alert_data)
-        if len(self.alert_history) > 1000:
-            self.alert_history = self.alert_history[-1000:]
         
-        # 发送到各个渠道
-        for channel_type, config in self.channels.items():
+        # 发送到各个渠道（enabled 可能在添加渠道后被修改，发送时检查）
+        for channel_type, config, handler in self._get_dispatch():
             if not config.enabled:
                 continue
             
             try:
-                if channel_type == AlertChannel.LOG:
-                    self._send_log_alert(rule, result)
-                elif channel_type == AlertChannel.EMAIL:
-                    self._send_email_alert(rule, result, config.config)
-                elif channel_type == AlertChannel.WEBHOOK:
-                    self._send_webhook_alert(rule, result, config.config)
-                elif channel_type == AlertChannel.SLACK:
-                    self._send_slack_alert(rule, result, config.config)
-                elif channel_type == AlertChannel.DINGTALK:
-                    self._send_dingtalk_alert(rule, result, config.config)
+                handler(rule, result, alert_data, config.config)
             except Exception as e:
                 logger.error(f"发送告警到 {channel_type.value} 时出错: {e}", exc_info=True)
     
-    def _send_log_alert(self, rule: MonitorRule, result: MonitorResult) -> None:
+    def _submit(self, channel: AlertChannel, send: Callable[..., None], *args: Any) -> None:
+        """在后台线程中发送告警"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=HTTP_ALERT_WORKERS, thread_name_prefix="alert")
+            future = self._executor.submit(send, *args)
+        future.add_done_callback(partial(_log_send_error, channel))
+    
+    # HTTP 渠道在生成消息之前检查配置，配置不完整时不生成消息、不提交后台任务
+    
+    def _submit_webhook_alert(self, rule: MonitorRule, result: MonitorResult,
+                              alert_data: Dict[str, Any], config: Dict[str, Any]) -> None:
+        if requests is None:
+            logger.error("requests 库未安装，无法发送 Webhook 告警")
+            return
+        webhook_url = config.get("url")
+        if not webhook_url:
+            logger.warning("Webhook 告警未配置 URL")
+            return
+        # 请求体复用告警记录，只编码一次
+        body = _encode_json(dict(alert_data, description=rule.description))
+        self._submit(AlertChannel.WEBHOOK, self._send_webhook_alert, webhook_url, body, config)
+    
+    def _submit_slack_alert(self, rule: MonitorRule, result: MonitorResult,
+                            alert_data: Dict[str, Any], config: Dict[str, Any]) -> None:
+        if requests is None:
+            logger.error("requests 库未安装，无法发送 Slack 告警")
+            return
+        webhook_url = config.get("webhook_url")
+        if not webhook_url:
+            logger.warning("Slack 告警未配置 webhook_url")
+            return
+        self._submit(AlertChannel.SLACK, self._send_slack_alert, webhook_url, _message_fields(rule, result), config)
+    
+    def _submit_dingtalk_alert(self, rule: MonitorRule, result: MonitorResult,
+                               alert_data: Dict[str, Any], config: Dict[str, Any]) -> None:
+        if requests is None:
+            logger.error("requests 库未安装，无法发送钉钉告警")
+            return
+        webhook_url = config.get("webhook_url")
+        if not webhook_url:
+            logger.warning("钉钉告警未配置 webhook_url")
+            return
+        fields = _message_fields(rule, result)
+        self._submit(AlertChannel.DINGTALK, self._send_dingtalk_alert, webhook_url, fields, config)
+    
+    def _send_log_alert(self, rule: MonitorRule, result: MonitorResult,
+                        alert_data: Dict[str, Any], config: Dict[str, Any]) -> None:
         """发送日志告警"""
+        # 使用 % 参数，日志级别高于 WARNING 时不会格式化消息
         logger.warning(
-            f"🚨 监控告警 - 规则: {rule.name}\n"
-            f"  差异数量: {result.diff_count}\n"
-            f"  差异百分比: {result.diff_percent:.2f}%\n"
-            f"  表1行数: {result.row_count_table1}\n"
-            f"  表2行数: {result.row_count_table2}\n"
-            f"  时间: {result.timestamp}"
+            "🚨 监控告警 - 规则: %s\n"
+            "  差异数量: %s\n"
+            "  差异百分比: %.2f%%\n"
+            "  表1行数: %s\n"
+            "  表2行数: %s\n"
+            "  时间: %s",
+            rule.name, result.diff_count, result.diff_percent,
+            result.row_count_table1, result.row_count_table2, result.timestamp
         )
     
-    def _send_email_alert(self, rule: MonitorRule, result: MonitorResult, config: Dict[str, Any]) -> None:
+    def _send_email_alert(self, rule: MonitorRule, result: MonitorResult,
+                          alert_data: Dict[str, Any], config: Dict[str, Any]) -> None:
         """发送邮件告警"""
         smtp_host = config.get("smtp_host", "localhost")
         smtp_port = config.get("smtp_port", 25)
@@ -143,7 +310,7 @@ class AlertManager:
 - 耗时: {result.duration_seconds:.2f}秒
 
 统计信息:
-{json.dumps(result.stats, indent=2, ensure_ascii=False)}
+{_get_stats_json(result)}
 """
         
         msg = MIMEMultipart()
@@ -153,95 +320,90 @@ class AlertManager:
         msg.attach(MIMEText(body, "plain", "utf-8"))
         
         try:
-            with smtplib.SMTP(smtp_host, smtp_port) as server:
-                if smtp_user and smtp_password:
-                    server.starttls()
-                    server.login(smtp_user, smtp_password)
-                server.send_message(msg)
-            logger.info(f"邮件告警已发送到: {to_emails}")
+            with self._smtp_lock:
+                self._send_smtp(msg, smtp_host, smtp_port, smtp_user, smtp_password)
+            logger.info("邮件告警已发送到: %s", to_emails)
         except Exception as e:
             logger.error(f"发送邮件告警失败: {e}")
     
-    def _send_webhook_alert(self, rule: MonitorRule, result: MonitorResult, config: Dict[str, Any]) -> None:
-        """发送 Webhook 告警"""
-        if requests is None:
-            logger.error("requests 库未安装，无法发送 Webhook 告警")
-            return
-        
-        webhook_url = config.get("url")
-        if not webhook_url:
-            logger.warning("Webhook 告警未配置 URL")
-            return
+    def _send_smtp(self, msg: MIMEMultipart, host: str, port: int,
+                   user: Optional[str], password: Optional[str]) -> None:
+        """通过连接池中的 SMTP 连接发送邮件，连接已被服务器断开时重连一次（需持有 _smtp_lock）"""
+        key = (host, port, user)
+        for attempt in range(2):
+            server = self._get_smtp(key, password)
+            try:
+                server.send_message(msg)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._discard_smtp(key)
+                if attempt:
+                    raise
+    
+    def _get_smtp(self, key: Tuple[str, int, Optional[str]], password: Optional[str]) -> smtplib.SMTP:
+        """获取已登录的 SMTP 连接，没有时新建（需持有 _smtp_lock）"""
+        server = self._smtp_pool.get(key)
+        if server is not None:
+            return server
         
-        payload = {
-            "rule_name": rule.name,
-            "description": rule.description,
-            "timestamp": result.timestamp.isoformat(),
-            "diff_count": result.diff_count,
-            "diff_percent": result.diff_percent,
-            "row_count_table1": result.row_count_table1,
-            "row_count_table2": result.row_count_table2,
-            "stats": result.stats,
-            "error": result.error
-        }
+        host, port, user = key
+        if port == 465:
+            # 隐式 TLS，省去 STARTTLS 往返
+            server = smtplib.SMTP_SSL(host, port)
+        else:
+            server = smtplib.SMTP(host, port)
+            if user and password:
+                server.starttls()
+        try:
+            if user and password:
+                server.login(user, password)
+        except BaseException:
+            server.close()
+            raise
         
-        headers = config.get("headers", {"Content-Type": "application/json"})
-        timeout = config.get("timeout", 10)
+        self._smtp_pool[key] = server
+        return server
+    
+    def _discard_smtp(self, key: Tuple[str, int, Optional[str]]) -> None:
+        """关闭并移除池中的 SMTP 连接（需持有 _smtp_lock）"""
+        server = self._smtp_pool.pop(key, None)
+        if server is None:
+            return
+        try:
+            server.quit()
+        except smtplib.SMTPException:
+            server.close()
+    
+    def _send_webhook_alert(self, webhook_url: str, body: bytes, config: Dict[str, Any]) -> None:
+        """发送 Webhook 告警"""
+        headers = {"Content-Type": "application/json", **config.get("headers", {})}
+        timeout = config.get("timeout", DEFAULT_HTTP_TIMEOUT)
         
         try:
-            response = requests.post(webhook_url, json=payload, headers=headers, timeout=timeout)
+            response = self._session.post(webhook_url, data=body, headers=headers, timeout=timeout)
             response.raise_for_status()
-            logger.info(f"Webhook 告警已发送到: {webhook_url}")
+            logger.info("Webhook 告警已发送到: %s", webhook_url)
         except Exception as e:
             logger.error(f"发送 Webhook 告警失败: {e}")
     
-    def _send_slack_alert(self, rule: MonitorRule, result: MonitorResult, config: Dict[str, Any]) -> None:
+    def _send_slack_alert(self, webhook_url: str, fields: List[Tuple[str, str]], config: Dict[str, Any]) -> None:
         """发送 Slack 告警"""
-        if requests is None:
-            logger.error("requests 库未安装，无法发送 Slack 告警")
-            return
-        
-        webhook_url = config.get("webhook_url")
-        if not webhook_url:
-            logger.warning("Slack 告警未配置 webhook_url")
-            return
-        
         # Slack 消息格式
-        text = f"🚨 *数据监控告警*\n\n"
-        text += f"*规则名称:* {rule.name}\n"
-        text += f"*差异数量:* {result.diff_count}\n"
-        text += f"*差异百分比:* {result.diff_percent:.2f}%\n"
-        text += f"*表1行数:* {result.row_count_table1}\n"
-        text += f"*表2行数:* {result.row_count_table2}\n"
-        text += f"*时间:* {result.timestamp}"
+        text = "🚨 *数据监控告警*\n\n" + "\n".join([f"*{label}:* {value}" for label, value in fields])
         
         payload = {"text": text}
+        timeout = config.get("timeout", DEFAULT_HTTP_TIMEOUT)
         
         try:
-            response = requests.post(webhook_url, json=payload, timeout=10)
+            response = self._session.post(webhook_url, json=payload, timeout=timeout)
             response.raise_for_status()
             logger.info("Slack 告警已发送")
         except Exception as e:
             logger.error(f"发送 Slack 告警失败: {e}")
     
-    def _send_dingtalk_alert(self, rule: MonitorRule, result: MonitorResult, config: Dict[str, Any]) -> None:
+    def _send_dingtalk_alert(self, webhook_url: str, fields: List[Tuple[str, str]], config: Dict[str, Any]) -> None:
         """发送钉钉告警"""
-        if requests is None:
-            logger.error("requests 库未安装，无法发送钉钉告警")
-            return
-        
-        webhook_url = config.get("webhook_url")
-        if not webhook_url:
-            logger.warning("钉钉告警未配置 webhook_url")
-            return
-        
-        text = f"🚨 数据监控告警\n\n"
-        text += f"规则名称: {rule.name}\n"
-        text += f"差异数量: {result.diff_count}\n"
-        text += f"差异百分比: {result.diff_percent:.2f}%\n"
-        text += f"表1行数: {result.row_count_table1}\n"
-        text += f"表2行数: {result.row_count_table2}\n"
-        text += f"时间: {result.timestamp}"
+        text = "🚨 数据监控告警\n\n" + "\n".join([f"{label}: {value}" for label, value in fields])
         
         payload = {
             "msgtype": "text",
@@ -249,9 +411,10 @@ class AlertManager:
                 "content": text
             }
         }
+        timeout = config.get("timeout", DEFAULT_HTTP_TIMEOUT)
         
         try:
-            response = requests.post(webhook_url, json=payload, timeout=10)
+            response = self._session.post(webhook_url, json=payload, timeout=timeout)
             response.raise_for_status()
             logger.info("钉钉告警已发送")
         except Exception as e:
@@ -259,5 +422,5 @@ class AlertManager:
     
     def get_alert_history(self, limit: int = 100) -> List[Dict[str, Any]]:
         """获取告警历史"""
-        return self.alert_history[-limit:]
+        return list(islice(self.alert_history, max(0, len(self.alert_history) - limit), None))
 
@@ -3,18 +3,37 @@ DataMonitor - 核心监控器实现
 """
 
 import logging
+import operator
+import sys
+import threading
 import time
+from collections import OrderedDict, deque
 from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Optional, Any, Tuple
+from itertools import islice
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Any, Tuple
 from dataclasses import dataclass, field
 
-from data_diff import connect_to_table, diff_tables, Algorithm
+from data_diff import connect, diff_tables, Algorithm
+from data_diff.databases import Database
 from data_diff.diff_tables import DiffResultWrapper
+from data_diff.queries.api import table, this
+from data_diff.queries.ast_classes import Count, Select
+from data_diff.table_segment import TableSegment
 from data_diff.utils import getLogger
 
 logger = getLogger(__name__)
 
+# 保留的最近监控结果数
+MAX_RESULTS = 1000
+# 缓存的数据库连接数
+CONNECTION_CACHE_SIZE = 64
+# 表结构缓存的有效期（秒）
+SCHEMA_CACHE_TTL = 60.0
+
+# 规则和结果数量多时使用 __slots__ 减少内存占用（dataclass 的 slots 参数需要 Python 3.10+）
+_DATACLASS_SLOTS: Dict[str, bool] = {"slots": True} if sys.version_info >= (3, 10) else {}
+
 
 class MonitorType(Enum):
     """监控类型"""
@@ -35,7 +54,7 @@ class RuleOperator(Enum):
     BETWEEN = "between"  # 在范围内
 
 
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class MonitorRule:
     """监控规则"""
     name: str
@@ -47,6 +66,9 @@ class MonitorRule:
     key_columns: Tuple[str, ...] = ("id",)
     update_column: Optional[str] = None
     extra_columns: Tuple[str, ...] = ()
+    # 变更计数表（列 name, counter），由写入方在每次修改表时递增对应表的计数。
+    # 设置后数据差异监控先读取两边的计数，都与上次完整比较时相同则沿用上次的结果，不再逐行比较
+    counter_table: Optional[str] = None
     
     # 阈值规则
     threshold_type: Optional[str] = None  # "diff_count", "diff_percent", "row_count_diff"
@@ -63,7 +85,7 @@ class MonitorRule:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class MonitorResult:
     """监控结果"""
     rule_name: str
@@ -77,6 +99,48 @@ class MonitorResult:
     error: Optional[str] = None
     duration_seconds: float = 0.0
     triggered: bool = False  # 是否触发告警阈值
+    # 缓存的 stats JSON 文本（邮件告警使用），见 alert._get_stats_json
+    _stats_json: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
+
+def _close_database(database: Database) -> None:
+    """关闭不再使用的数据库连接；连接已经断开时关闭可能出错，忽略即可"""
+    try:
+        database.close()
+    except Exception as e:
+        logger.debug("关闭数据库连接时出错: %s", e)
+
+
+# 阈值类型 -> 从监控结果中取出要比较的值
+_VALUE_EXTRACTORS: Dict[str, Callable[[MonitorResult], float]] = {
+    "diff_count": lambda result: result.diff_count,
+    "diff_percent": lambda result: result.diff_percent,
+    "row_count_diff": lambda result: abs(result.row_count_table1 - result.row_count_table2),
+}
+
+# 阈值操作符 -> 比较函数
+_OPERATORS: Dict[RuleOperator, Callable[[float, float], bool]] = {
+    RuleOperator.GT: operator.gt,
+    RuleOperator.GTE: operator.ge,
+    RuleOperator.LT: operator.lt,
+    RuleOperator.LTE: operator.le,
+    RuleOperator.EQ: lambda value, threshold: abs(value - threshold) < 0.0001,
+    RuleOperator.NE: lambda value, threshold: abs(value - threshold) >= 0.0001,
+}
+
+
+def _compile_threshold(rule: MonitorRule) -> Optional[Callable[[MonitorResult], bool]]:
+    """把规则的阈值条件编译为判断函数，规则没有（有效的）阈值时返回 None"""
+    if not rule.threshold_type or rule.threshold_value is None:
+        return None
+    
+    extract = _VALUE_EXTRACTORS.get(rule.threshold_type)
+    compare = _OPERATORS.get(rule.threshold_operator)
+    if extract is None or compare is None:
+        return None
+    
+    threshold = rule.threshold_value
+    return lambda result: compare(extract(result), threshold)
 
 
 class DataMonitor:
@@ -84,23 +148,174 @@ class DataMonitor:
     
     def __init__(self):
         self.rules: Dict[str, MonitorRule] = {}
-        self.results: List[MonitorResult] = []
+        # 规则名 -> ((阈值类型, 操作符, 阈值), 编译好的判断函数)；规则的阈值修改后重新编译
+        self._thresholds: Dict[str, Tuple[Tuple[Any, ...], Optional[Callable[[MonitorResult], bool]]]] = {}
+        # 超出容量时自动丢弃最旧的结果
+        self.results: Deque[MonitorResult] = deque(maxlen=MAX_RESULTS)
+        # 按规则名索引的结果，与 results 同步增删，按规则查询时无需扫描全部结果
+        self._results_by_rule: Dict[str, Deque[MonitorResult]] = {}
+        # 并发执行的规则同时写入结果
+        self._results_lock = threading.Lock()
+        # 连接串 -> 数据库连接，按 LRU 缓存，定时执行时不再每次重新连接数据库。
+        # 连接由监控器独占（不使用 connect() 的共享连接），移出缓存时可以安全关闭
+        self._connections: "OrderedDict[str, Database]" = OrderedDict()
+        # (连接串, 表名) -> (读取时间, 表结构)
+        self._schema_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+        # 调度线程和手动触发可能同时访问缓存
+        self._cache_lock = threading.Lock()
+        # id(数据库连接) -> 正在执行的规则中使用它的次数；移出缓存的连接等使用结束后再关闭
+        self._leases: Dict[int, int] = {}
+        self._retired: Dict[int, Database] = {}
+        # 当前线程正在执行的规则借用的连接
+        self._local = threading.local()
+        # 规则名 -> (上次完整比较时两边的变更计数, 比较结果)，见 MonitorRule.counter_table
+        self._change_counters: Dict[str, Tuple[Tuple[Any, Any], MonitorResult]] = {}
+        # 规则增删时的回调（如调度器重新安排执行时间）
+        self._rule_listeners: List[Callable[[str], None]] = []
+    
+    def add_rule_listener(self, listener: Callable[[str], None]) -> None:
+        """注册规则变更回调，添加、覆盖或移除规则后以规则名调用"""
+        self._rule_listeners.append(listener)
+    
+    def _notify_rule_changed(self, rule_name: str) -> None:
+        for listener in self._rule_listeners:
+            listener(rule_name)
     
     def add_rule(self, rule: MonitorRule) -> None:
         """添加监控规则"""
-        if rule.name in self.rules:
-            logger.warning(f"规则 '{rule.name}' 已存在，将被覆盖")
+        # 规则名和 cron 表达式反复用作结果索引、调度器和缓存的字典键，驻留后比较只需比较指针；
+        # 规则只在注册时驻留，数量有限
+        rule.name = sys.intern(rule.name)
+        if rule.schedule:
+            rule.schedule = sys.intern(rule.schedule)
+        existing = self.rules.get(rule.name)
+        if existing is not None and existing is not rule:
+            logger.warning("规则 '%s' 已存在，将被覆盖", rule.name)
         self.rules[rule.name] = rule
-        logger.info(f"添加监控规则: {rule.name} ({rule.monitor_type.value})")
+        # 规则可能换了表，上次比较时的变更计数不再适用
+        self._change_counters.pop(rule.name, None)
+        logger.info("添加监控规则: %s (%s)", rule.name, rule.monitor_type.value)
+        self._notify_rule_changed(rule.name)
     
     def remove_rule(self, rule_name: str) -> bool:
         """移除监控规则"""
         if rule_name in self.rules:
             del self.rules[rule_name]
-            logger.info(f"移除监控规则: {rule_name}")
+            self._thresholds.pop(rule_name, None)
+            self._change_counters.pop(rule_name, None)
+            logger.info("移除监控规则: %s", rule_name)
+            self._notify_rule_changed(rule_name)
             return True
         return False
     
+    def invalidate(self, database: Optional[str] = None, table: Optional[str] = None) -> None:
+        """清除缓存的表结构；不指定 table 时同时关闭缓存的数据库连接，都不指定时清除全部"""
+        def matches(db: str, tbl: str) -> bool:
+            return (database is None or db == database) and (table is None or tbl == table)
+        
+        evicted = []
+        with self._cache_lock:
+            for key in [key for key in self._schema_cache if matches(*key)]:
+                del self._schema_cache[key]
+            if table is None:
+                evicted = [self._connections.pop(db) for db in list(self._connections) if database in (None, db)]
+        self._retire(evicted)
+    
+    def _lease(self, database: Database) -> None:
+        """记录当前线程正在执行的规则使用了该连接（调用方需持有 _cache_lock）"""
+        leases = getattr(self._local, "leases", None)
+        if leases is not None:
+            leases.append(database)
+            self._leases[id(database)] = self._leases.get(id(database), 0) + 1
+    
+    def _retire(self, databases: Iterable[Database]) -> None:
+        """关闭移出缓存的连接，仍被正在执行的规则使用的连接等使用结束后再关闭"""
+        to_close = []
+        with self._cache_lock:
+            for database in databases:
+                if self._leases.get(id(database)):
+                    self._retired[id(database)] = database
+                else:
+                    to_close.append(database)
+        for database in to_close:
+            _close_database(database)
+    
+    def _release_leases(self) -> None:
+        """规则执行结束，归还借用的连接"""
+        leases, self._local.leases = self._local.leases, None
+        to_close = []
+        with self._cache_lock:
+            for database in leases:
+                remaining = self._leases[id(database)] - 1
+                if remaining:
+                    self._leases[id(database)] = remaining
+                    continue
+                del self._leases[id(database)]
+                retired = self._retired.pop(id(database), None)
+                if retired is not None:
+                    to_close.append(retired)
+        for database in to_close:
+            _close_database(database)
+    
+    def _invalidate_rule(self, rule: MonitorRule) -> None:
+        """关闭规则用到的数据库连接。连接断开后 ThreadedDatabase 不会自动重连，出错后下次执行需要重新连接"""
+        self.invalidate(rule.database1)
+        if rule.database2 and rule.database2 != rule.database1:
+            self.invalidate(rule.database2)
+    
+    def _get_table(self, database: str, table: str, key_columns: Tuple[str, ...],
+                   update_column: Optional[str] = None, extra_columns: Tuple[str, ...] = ()) -> TableSegment:
+        """获取表，使用缓存的数据库连接"""
+        db = self._get_connection(database)
+        return TableSegment(
+            db,
+            db.dialect.parse_table_name(table),
+            tuple(key_columns),
+            update_column=update_column,
+            extra_columns=tuple(extra_columns)
+        )
+    
+    def _get_connection(self, database: str) -> Database:
+        """获取数据库连接，优先使用缓存"""
+        with self._cache_lock:
+            db = self._connections.get(database)
+            if db is not None and not db.is_closed:
+                self._connections.move_to_end(database)
+                self._lease(db)
+                return db
+        
+        # 在锁外连接数据库，避免阻塞其他规则
+        db = connect(database, shared=False)
+        evicted = []
+        with self._cache_lock:
+            cached = self._connections.get(database)
+            if cached is not None and not cached.is_closed:
+                # 其他线程同时连接了同一个数据库，使用先缓存的连接
+                evicted.append(db)
+                db = cached
+            else:
+                self._connections[database] = db
+            self._connections.move_to_end(database)
+            self._lease(db)
+            while len(self._connections) > CONNECTION_CACHE_SIZE:
+                evicted.append(self._connections.popitem(last=False)[1])
+        self._retire(evicted)
+        return db
+    
+    def _get_schema(self, database: str, table: str, key_columns: Tuple[str, ...]) -> Dict[str, Any]:
+        """获取表结构，SCHEMA_CACHE_TTL 秒内重复读取时使用缓存"""
+        key = (database, table)
+        now = time.monotonic()
+        with self._cache_lock:
+            cached = self._schema_cache.get(key)
+            if cached is not None and now - cached[0] < SCHEMA_CACHE_TTL:
+                return cached[1]
+        
+        schema = self._get_table(database, table, key_columns).get_schema()
+        with self._cache_lock:
+            self._schema_cache[key] = (now, schema)
+        return schema
+    
     def run_monitor(self, rule_name: str) -> MonitorResult:
         """执行单个监控规则"""
         if rule_name not in self.rules:
@@ -108,7 +323,7 @@ class DataMonitor:
         
         rule = self.rules[rule_name]
         if not rule.enabled:
-            logger.info(f"监控规则 '{rule_name}' 已禁用，跳过执行")
+            logger.info("监控规则 '%s' 已禁用，跳过执行", rule_name)
             return MonitorResult(
                 rule_name=rule_name,
                 timestamp=datetime.now(),
@@ -118,6 +333,7 @@ class DataMonitor:
         
         start_time = time.monotonic()
         result = None
+        self._local.leases = []
         
         try:
             if rule.monitor_type == MonitorType.DATA_DIFF:
@@ -134,6 +350,8 @@ class DataMonitor:
             
         except Exception as e:
             logger.error(f"执行监控规则 '{rule_name}' 时出错: {e}", exc_info=True)
+            # 错误可能来自断开的连接，下次执行时重新连接
+            self._invalidate_rule(rule)
             result = MonitorResult(
                 rule_name=rule_name,
                 timestamp=datetime.now(),
@@ -141,21 +359,33 @@ class DataMonitor:
                 error=str(e),
                 duration_seconds=time.monotonic() - start_time
             )
+        finally:
+            self._release_leases()
         
         if result:
             result.duration_seconds = time.monotonic() - start_time
-            self.results.append(result)
-            # 只保留最近1000条结果
-            if len(self.results) > 1000:
-                self.results = self.results[-1000:]
+            self._append_result(result)
         
         return result
     
+    def _append_result(self, result: MonitorResult) -> None:
+        """保存监控结果，超出 MAX_RESULTS 时同时从规则索引中移除最旧的结果"""
+        with self._results_lock:
+            if len(self.results) == self.results.maxlen:
+                oldest = self.results[0]
+                rule_results = self._results_by_rule.get(oldest.rule_name)
+                if rule_results:
+                    rule_results.popleft()
+                    if not rule_results:
+                        del self._results_by_rule[oldest.rule_name]
+            self.results.append(result)
+            self._results_by_rule.setdefault(result.rule_name, deque()).append(result)
+    
     def _run_data_diff_monitor(self, rule: MonitorRule) -> MonitorResult:
         """执行数据差异监控"""
-        logger.info(f"执行数据差异监控: {rule.name}")
+        logger.info("执行数据差异监控: %s", rule.name)
         
-        table1 = connect_to_table(
+        table1 = self._get_table(
             rule.database1,
             rule.table1,
             rule.key_columns,
@@ -163,9 +393,10 @@ class DataMonitor:
             extra_columns=rule.extra_columns
         )
         
+        table2_name = rule.table2 or rule.table1
         if rule.database2 and rule.table2:
             # 跨数据库比较
-            table2 = connect_to_table(
+            table2 = self._get_table(
                 rule.database2,
                 rule.table2,
                 rule.key_columns,
@@ -175,15 +406,23 @@ class DataMonitor:
             algorithm = Algorithm.HASHDIFF
         else:
             # 同数据库比较
-            table2 = connect_to_table(
+            table2 = self._get_table(
                 rule.database1,
-                rule.table2 or rule.table1,
+                table2_name,
                 rule.key_columns,
                 update_column=rule.update_column,
                 extra_columns=rule.extra_columns
             )
             algorithm = Algorithm.JOINDIFF
         
+        counters = None
+        if rule.counter_table:
+            counters = self._get_change_counters(rule, table1, table2, table2_name)
+            previous = self._change_counters.get(rule.name)
+            if counters is not None and previous is not None and previous[0] == counters:
+                logger.info("规则 %s 两边的变更计数与上次相同 %s，跳过逐行比较", rule.name, counters)
+                return self._unchanged_result(rule, previous[1])
+        
         diff_result: DiffResultWrapper = diff_tables(
             table1,
             table2,
@@ -191,8 +430,8 @@ class DataMonitor:
             extra_columns=rule.extra_columns
         )
         
-        # 获取统计信息
-        stats = diff_result.get_stats_dict()
+        # 获取统计信息；监控只需要汇总数字，差异行边读取边统计，不保存在内存中
+        stats = diff_result.get_stats_dict(keep_rows=False)
         
         diff_count = stats.get("total", 0)
         row_count1 = stats.get("rows_A", 0)
@@ -202,7 +441,7 @@ class DataMonitor:
         max_rows = max(row_count1, row_count2) if (row_count1 or row_count2) else 1
         diff_percent = (diff_count / max_rows * 100) if max_rows > 0 else 0.0
         
-        return MonitorResult(
+        result = MonitorResult(
             rule_name=rule.name,
             timestamp=datetime.now(),
             success=True,
@@ -212,18 +451,66 @@ class DataMonitor:
             row_count_table2=row_count2,
             stats=stats
         )
+        if counters is not None:
+            # 计数在比较之前读取，比较期间的修改会使下次读到的计数不同，不会被漏掉
+            stats["change_counters"] = list(counters)
+            self._change_counters[rule.name] = (counters, result)
+        return result
+    
+    def _get_change_counters(self, rule: MonitorRule, table1: TableSegment, table2: TableSegment,
+                             table2_name: str) -> Optional[Tuple[Any, Any]]:
+        """读取两边的变更计数；任一边没有记录或读取出错时返回 None，此时做完整比较"""
+        try:
+            counter1 = self._get_change_counter(table1, rule.counter_table, rule.table1)
+            counter2 = self._get_change_counter(table2, rule.counter_table, table2_name)
+        except Exception as e:
+            logger.warning("规则 %s 读取变更计数表 %s 失败，执行完整比较: %s", rule.name, rule.counter_table, e)
+            return None
+        if counter1 is None or counter2 is None:
+            logger.info("规则 %s 的变更计数表 %s 中没有表的记录，执行完整比较", rule.name, rule.counter_table)
+            return None
+        return counter1, counter2
+    
+    def _get_change_counter(self, segment: TableSegment, counter_table: str, table_name: str) -> Optional[Any]:
+        """读取变更计数表中 table_name 的计数，没有记录时返回 None"""
+        database = segment.database
+        query = (
+            table(*database.dialect.parse_table_name(counter_table))
+            .where(this.name == table_name)
+            .select(this.counter)
+        )
+        rows = database.query(query, list)
+        return rows[0][0] if rows else None
+    
+    def _unchanged_result(self, rule: MonitorRule, previous: MonitorResult) -> MonitorResult:
+        """两边的变更计数与上次完整比较时相同，沿用那次的比较结果"""
+        return MonitorResult(
+            rule_name=rule.name,
+            timestamp=datetime.now(),
+            success=True,
+            diff_count=previous.diff_count,
+            diff_percent=previous.diff_percent,
+            row_count_table1=previous.row_count_table1,
+            row_count_table2=previous.row_count_table2,
+            stats={**previous.stats, "skipped": True}
+        )
     
     def _run_row_count_monitor(self, rule: MonitorRule) -> MonitorResult:
         """执行行数监控"""
-        logger.info(f"执行行数监控: {rule.name}")
+        logger.info("执行行数监控: %s", rule.name)
         
-        table1 = connect_to_table(rule.database1, rule.table1, rule.key_columns)
-        row_count1 = table1.count()
+        table1 = self._get_table(rule.database1, rule.table1, rule.key_columns)
         
-        row_count2 = 0
         if rule.database2 and rule.table2:
-            table2 = connect_to_table(rule.database2, rule.table2, rule.key_columns)
-            row_count2 = table2.count()
+            table2 = self._get_table(rule.database2, rule.table2, rule.key_columns)
+            if rule.database2 == rule.database1:
+                # 同一数据库时用一条查询同时统计两张表，减少一次往返
+                query = Select(columns=[table1.make_select().select(Count()), table2.make_select().select(Count())])
+                row_count1, row_count2 = table1.database.query(query, tuple)
+            else:
+                row_count1, row_count2 = table1.count(), table2.count()
+        else:
+            row_count1, row_count2 = table1.count(), 0
         
         diff_count = abs(row_count1 - row_count2)
         diff_percent = (diff_count / max(row_count1, row_count2) * 100) if max(row_count1, row_count2) > 0 else 0.0
@@ -240,18 +527,15 @@ class DataMonitor:
     
     def _run_schema_change_monitor(self, rule: MonitorRule) -> MonitorResult:
         """执行模式变更监控"""
-        logger.info(f"执行模式变更监控: {rule.name}")
+        logger.info("执行模式变更监控: %s", rule.name)
         
-        table1 = connect_to_table(rule.database1, rule.table1, rule.key_columns)
-        schema1 = table1.get_schema()
+        schema1 = self._get_schema(rule.database1, rule.table1, rule.key_columns)
         
         schema2 = {}
         if rule.database2 and rule.table2:
-            table2 = connect_to_table(rule.database2, rule.table2, rule.key_columns)
-            schema2 = table2.get_schema()
+            schema2 = self._get_schema(rule.database2, rule.table2, rule.key_columns)
         elif rule.table2:
-            table2 = connect_to_table(rule.database1, rule.table2, rule.key_columns)
-            schema2 = table2.get_schema()
+            schema2 = self._get_schema(rule.database1, rule.table2, rule.key_columns)
         
         # 比较模式差异
         cols1 = set(schema1.keys())
@@ -282,44 +566,20 @@ class DataMonitor:
     
     def _check_threshold(self, rule: MonitorRule, result: MonitorResult) -> bool:
         """检查是否触发阈值"""
-        if not rule.threshold_type or rule.threshold_value is None:
-            return False
-        
-        value_to_check = None
-        if rule.threshold_type == "diff_count":
-            value_to_check = result.diff_count
-        elif rule.threshold_type == "diff_percent":
-            value_to_check = result.diff_percent
-        elif rule.threshold_type == "row_count_diff":
-            value_to_check = abs(result.row_count_table1 - result.row_count_table2)
-        
-        if value_to_check is None:
-            return False
-        
-        op = rule.threshold_operator
-        threshold = rule.threshold_value
-        
-        if op == RuleOperator.GT:
-            return value_to_check > threshold
-        elif op == RuleOperator.GTE:
-            return value_to_check >= threshold
-        elif op == RuleOperator.LT:
-            return value_to_check < threshold
-        elif op == RuleOperator.LTE:
-            return value_to_check <= threshold
-        elif op == RuleOperator.EQ:
-            return abs(value_to_check - threshold) < 0.0001
-        elif op == RuleOperator.NE:
-            return abs(value_to_check - threshold) >= 0.0001
-        
-        return False
+        key = (rule.threshold_type, rule.threshold_operator, rule.threshold_value)
+        cached = self._thresholds.get(rule.name)
+        if cached is not None and cached[0] == key:
+            predicate = cached[1]
+        else:
+            predicate = _compile_threshold(rule)
+            self._thresholds[rule.name] = (key, predicate)
+        return predicate is not None and predicate(result)
     
     def get_results(self, rule_name: Optional[str] = None, limit: int = 100) -> List[MonitorResult]:
         """获取监控结果"""
-        results = self.results
-        if rule_name:
-            results = [r for r in results if r.rule_name == rule_name]
-        return results[-limit:]
+        with self._results_lock:
+            results = self._results_by_rule.get(rule_name, ()) if rule_name else self.results
+            return list(islice(results, max(0, len(results) - limit), None))
     
     def get_rule(self, rule_name: str) -> Optional[MonitorRule]:
         """获取监控规则"""
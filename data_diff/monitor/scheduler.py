@@ -4,34 +4,73 @@ MonitorScheduler - 监控调度器
 支持基于 cron 表达式的定时调度
 """
 
+import heapq
+import itertools
 import logging
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
 try:
     from croniter import croniter
 except ImportError:
     raise ImportError("croniter is required for MonitorScheduler. Install it with: pip install croniter")
 
-from data_diff.monitor.monitor import DataMonitor, MonitorRule, MonitorResult
+from data_diff.monitor.monitor import DataMonitor, MonitorResult, MonitorRule
 from data_diff.monitor.alert import AlertManager
 from data_diff.utils import getLogger
 
 logger = getLogger(__name__)
 
+# 同时执行的规则数上限
+DEFAULT_MAX_PARALLEL_RULES = 4
+# 检查规则的 cron 表达式和启用状态是否被直接修改的间隔秒数
+SCHEDULE_SYNC_INTERVAL = 1.0
+
+
+def _active_schedule(rule: Optional[MonitorRule]) -> Optional[str]:
+    """规则当前生效的 cron 表达式，规则不存在、已禁用或没有表达式时返回 None"""
+    if rule is None or not rule.enabled or not rule.schedule:
+        return None
+    return rule.schedule
+
 
 class MonitorScheduler:
-    """监控调度器"""
+    """监控调度器
+    
+    规则按下次执行时间放在最小堆中，调度线程在最近的执行时间到达时醒来；
+    规则增删（DataMonitor.add_rule/remove_rule）或停止调度器时立即唤醒。
+    直接修改已添加规则的 schedule、enabled 不会触发回调，调度线程每 SCHEDULE_SYNC_INTERVAL
+    秒对比一次规则当前的表达式，变化时重新安排；到期执行时也按规则当前的表达式安排下一次执行。
+    到期的规则提交到线程池并发执行；上一次执行尚未结束的规则跳过本次执行。
+    错过的多次执行（如调度线程被阻塞）只补执行一次，下次执行时间从当前时间重新计算。
+    """
     
-    def __init__(self, monitor: DataMonitor, alert_manager: Optional[AlertManager] = None):
+    def __init__(self, monitor: DataMonitor, alert_manager: Optional[AlertManager] = None,
+                 max_parallel_rules: int = DEFAULT_MAX_PARALLEL_RULES):
         self.monitor = monitor
         self.alert_manager = alert_manager
+        self.max_parallel_rules = max_parallel_rules
         self._running = False
         self._thread: Optional[threading.Thread] = None
         self._stop_event = threading.Event()
         self._schedule_times: Dict[str, datetime] = {}
+        # (执行时间戳, 序号, 规则名)；规则重新安排后旧条目失效，弹出时丢弃
+        self._heap: List[Tuple[float, int, str]] = []
+        self._heap_seq = itertools.count()
+        self._current_seq: Dict[str, int] = {}
+        # 规则名 -> 安排执行时使用的 cron 表达式（包括无效的表达式，避免反复解析和报错）
+        self._scheduled: Dict[str, str] = {}
+        # 规则名 -> (cron 表达式, 解析好的 croniter)，表达式变化时重新解析
+        self._cron_cache: Dict[str, Tuple[str, croniter]] = {}
+        self._heap_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._rule_executor: Optional[ThreadPoolExecutor] = None
+        # 正在执行的规则（受 _heap_lock 保护）
+        self._in_flight: Set[str] = set()
+        monitor.add_rule_listener(self._on_rule_changed)
     
     def start(self) -> None:
         """启动调度器"""
@@ -41,6 +80,8 @@ class MonitorScheduler:
         
         self._running = True
         self._stop_event.clear()
+        self._seed()
+        self._rule_executor = ThreadPoolExecutor(max_workers=self.max_parallel_rules, thread_name_prefix="monitor-rule")
         self._thread = threading.Thread(target=self._run_scheduler, daemon=True)
         self._thread.start()
         logger.info("监控调度器已启动")
@@ -52,69 +93,165 @@ class MonitorScheduler:
         
         self._running = False
         self._stop_event.set()
+        self._wakeup.set()
         if self._thread:
             self._thread.join(timeout=5.0)
+        if self._rule_executor:
+            # 不等待正在执行的规则，它们结束后照常发送告警
+            self._rule_executor.shutdown(wait=False)
+            self._rule_executor = None
+        if self.alert_manager:
+            self.alert_manager.close()
         logger.info("监控调度器已停止")
     
+    def _seed(self) -> None:
+        """为所有启用且带 cron 表达式的规则安排下次执行时间"""
+        now = datetime.now()
+        with self._heap_lock:
+            self._heap.clear()
+            self._current_seq.clear()
+            self._schedule_times.clear()
+            self._scheduled.clear()
+            for rule in self.monitor.list_rules():
+                self._reschedule(rule.name, _active_schedule(rule), now)
+    
+    def _reschedule(self, rule_name: str, schedule: Optional[str], now: datetime) -> None:
+        """按 schedule 重新安排规则，schedule 为 None 时不再定时执行（需持有 _heap_lock）"""
+        # 旧的堆条目随序号失效
+        self._current_seq.pop(rule_name, None)
+        self._schedule_times.pop(rule_name, None)
+        if schedule is None:
+            self._scheduled.pop(rule_name, None)
+            self._cron_cache.pop(rule_name, None)
+            return
+        self._scheduled[rule_name] = schedule
+        self._push(rule_name, schedule, now)
+    
+    def _push(self, rule_name: str, schedule: str, now: datetime) -> None:
+        """计算规则在 now 之后的下次执行时间并入堆（需持有 _heap_lock）"""
+        cron = self._get_cron(rule_name, schedule, now)
+        if cron is None:
+            return
+        
+        # 复用解析好的表达式，只重置起始时间
+        cron.set_current(now)
+        next_run = cron.get_next(datetime)
+        seq = next(self._heap_seq)
+        self._current_seq[rule_name] = seq
+        self._schedule_times[rule_name] = next_run
+        heapq.heappush(self._heap, (next_run.timestamp(), seq, rule_name))
+    
+    def _get_cron(self, rule_name: str, schedule: str, now: datetime) -> Optional[croniter]:
+        """获取规则的 croniter，表达式只在首次使用或变化时解析；无效时返回 None（需持有 _heap_lock）"""
+        cached = self._cron_cache.get(rule_name)
+        if cached is not None and cached[0] == schedule:
+            return cached[1]
+        
+        try:
+            cron = croniter(schedule, now)
+        except ValueError as e:
+            logger.error(f"规则 '{rule_name}' 的 cron 表达式 '{schedule}' 无效，不会定时执行: {e}")
+            self._cron_cache.pop(rule_name, None)
+            return None
+        
+        self._cron_cache[rule_name] = (schedule, cron)
+        return cron
+    
+    def _on_rule_changed(self, rule_name: str) -> None:
+        """规则添加、覆盖或移除后重新安排执行时间"""
+        rule = self.monitor.get_rule(rule_name)
+        with self._heap_lock:
+            self._reschedule(rule_name, _active_schedule(rule), datetime.now())
+        self._wakeup.set()
+    
+    def _sync_schedules(self) -> None:
+        """重新安排 cron 表达式或启用状态被直接修改过的规则"""
+        rules = self.monitor.list_rules()
+        now = datetime.now()
+        with self._heap_lock:
+            for rule in rules:
+                schedule = _active_schedule(rule)
+                if self._scheduled.get(rule.name) != schedule:
+                    self._reschedule(rule.name, schedule, now)
+            names = {rule.name for rule in rules}
+            for rule_name in [name for name in self._scheduled if name not in names]:
+                self._reschedule(rule_name, None, now)
+    
+    def _pop_due(self) -> List[str]:
+        """取出所有已到执行时间且不在执行中的规则，标记为执行中，并按规则当前的表达式安排下一次执行"""
+        now_ts = time.time()
+        due = []
+        with self._heap_lock:
+            while self._heap and self._heap[0][0] <= now_ts:
+                _, seq, rule_name = heapq.heappop(self._heap)
+                if self._current_seq.get(rule_name) != seq:
+                    continue
+                schedule = _active_schedule(self.monitor.get_rule(rule_name))
+                self._reschedule(rule_name, schedule, datetime.now())
+                if schedule is None:
+                    # 规则已被移除、禁用或去掉了 cron 表达式
+                    continue
+                if rule_name in self._in_flight:
+                    logger.warning("规则 '%s' 的上一次执行尚未结束，跳过本次执行", rule_name)
+                    continue
+                self._in_flight.add(rule_name)
+                due.append(rule_name)
+        return due
+    
+    def _next_delay(self) -> float:
+        """距离最近一次执行的秒数，最多 SCHEDULE_SYNC_INTERVAL 秒"""
+        with self._heap_lock:
+            if not self._heap:
+                return SCHEDULE_SYNC_INTERVAL
+            return min(SCHEDULE_SYNC_INTERVAL, max(0.0, self._heap[0][0] - time.time()))
+    
     def _run_scheduler(self) -> None:
         """调度器主循环"""
-        while self._running and not self._stop_event.is_set():
+        while not self._stop_event.is_set():
             try:
-                now = datetime.now()
-                rules = self.monitor.list_rules()
-                
-                for rule in rules:
-                    if not rule.enabled or not rule.schedule:
-                        continue
-                    
-                    # 检查是否到了执行时间
-                    if self._should_run(rule, now):
-                        logger.info(f"执行定时监控: {rule.name}")
-                        result = self.monitor.run_monitor(rule.name)
-                        
-                        # 如果触发阈值，发送告警
-                        if result and result.triggered and self.alert_manager:
-                            self.alert_manager.send_alert(rule, result)
+                self._sync_schedules()
+                due = self._pop_due()
+                if not due:
+                    # 睡到最近的执行时间（最多 SCHEDULE_SYNC_INTERVAL 秒），规则变更或停止时会被提前唤醒
+                    self._wakeup.wait(timeout=self._next_delay())
+                    self._wakeup.clear()
+                    continue
                 
-                # 每秒检查一次
-                time.sleep(1)
+                for rule_name in due:
+                    self._rule_executor.submit(self._run_in_flight, rule_name)
                 
             except Exception as e:
                 logger.error(f"调度器运行时出错: {e}", exc_info=True)
-                time.sleep(5)  # 出错后等待5秒再继续
+                # 出错后等待5秒再继续，期间停止调度器时立即退出
+                if self._stop_event.wait(timeout=5.0):
+                    break
     
-    def _should_run(self, rule: MonitorRule, now: datetime) -> bool:
-        """检查规则是否应该执行"""
-        rule_name = rule.name
-        
+    def _run_in_flight(self, rule_name: str) -> None:
+        """在线程池中执行规则，结束后清除执行中标记"""
         try:
-            # 获取上次执行时间
-            last_run = self._schedule_times.get(rule_name)
-            
-            if last_run is None:
-                # 第一次运行，计算下次执行时间
-                cron = croniter(rule.schedule, now)
-                next_run = cron.get_next(datetime)
-                self._schedule_times[rule_name] = next_run
-                return False
-            
-            # 检查是否到了执行时间
-            if now >= last_run:
-                # 计算下次执行时间
-                cron = croniter(rule.schedule, now)
-                next_run = cron.get_next(datetime)
-                self._schedule_times[rule_name] = next_run
-                return True
-            
-            return False
-            
+            self._run_rule(rule_name)
         except Exception as e:
-            logger.error(f"解析 cron 表达式 '{rule.schedule}' 时出错: {e}")
-            return False
+            logger.error(f"执行定时监控 '{rule_name}' 时出错: {e}", exc_info=True)
+        finally:
+            with self._heap_lock:
+                self._in_flight.discard(rule_name)
+    
+    def _run_rule(self, rule_name: str) -> None:
+        """执行到期的规则，触发阈值时发送告警"""
+        rule = self.monitor.get_rule(rule_name)
+        if rule is None or not rule.enabled:
+            return
+        
+        logger.info("执行定时监控: %s", rule.name)
+        result = self.monitor.run_monitor(rule.name)
+        
+        # 如果触发阈值，发送告警
+        if result and result.triggered and self.alert_manager:
+            self.alert_manager.send_alert(rule, result)
     
     def trigger_now(self, rule_name: str) -> Optional[MonitorResult]:
         """立即触发执行某个规则"""
-        logger.info(f"手动触发监控: {rule_name}")
+        logger.info("手动触发监控: %s", rule_name)
         result = self.monitor.run_monitor(rule_name)
         
         if result and result.triggered and self.alert_manager:
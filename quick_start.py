@@ -4,56 +4,125 @@
 
 使用方法：
 1. 确保已安装依赖: pip install croniter requests
-2. 运行: python quick_start.py
+2. 运行: python quick_start.py（加 --quiet/-q 只输出失败信息和最终结果）
 """
 
+import argparse
+import ast
+import importlib.util
 import sys
 import os
 
 # 添加项目路径
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PROJECT_DIR)
+
+# --quiet 时不输出标题、成功信息和使用示例
+QUIET = False
+
+
+def _write(lines):
+    """一次写出多行输出"""
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+
+
+def _banner(lines, title, leading_newline=True):
+    if not QUIET:
+        lines.extend([("\n" if leading_newline else "") + "=" * 60, title, "=" * 60])
+
+
+def _ok(lines, message):
+    if not QUIET:
+        lines.append(message)
+
+
+# 需要检查的模块及其应导出的名称
+EXPECTED_EXPORTS = [
+    ("DataMonitor", "data_diff.monitor", [
+        "DataMonitor", "MonitorRule", "MonitorType", "RuleOperator",
+        "MonitorScheduler", "AlertManager", "AlertChannel",
+    ]),
+    ("Migration Agent", "data_diff.migration", [
+        "MigrationAgent", "MigrationTask", "MigrationStatus",
+        "SQLTranslator", "DatabaseDialect", "MigrationValidator",
+    ]),
+]
+
+
+def _module_path(module):
+    """按路径在项目目录中查找模块的源文件，找不到时返回 None
+    
+    不使用 importlib.util.find_spec：查找 data_diff.monitor 这样的子模块时它会先导入父包 data_diff。
+    """
+    path = os.path.join(PROJECT_DIR, *module.split("."))
+    for candidate in (os.path.join(path, "__init__.py"), path + ".py"):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def _module_exports(path):
+    """解析模块源码，返回模块顶层定义或导入的名称（不执行模块）"""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    
+    names = set()
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.Assign):
+            names.update(target.id for target in node.targets if isinstance(target, ast.Name))
+    return names
+
 
 def test_imports():
-    """测试导入是否正常"""
-    print("=" * 60)
-    print("步骤 1: 测试模块导入")
-    print("=" * 60)
+    """测试模块是否存在并导出所需的名称
     
-    try:
-        from data_diff.monitor import (
-            DataMonitor, MonitorRule, MonitorType, RuleOperator,
-            MonitorScheduler, AlertManager, AlertChannel
-        )
-        print("✓ DataMonitor 模块导入成功")
-    except Exception as e:
-        print(f"✗ DataMonitor 模块导入失败: {e}")
-        return False
+    只按路径找到模块的 __init__.py 并解析，不导入任何模块；真正的导入在 test_basic_functionality 中进行。
+    """
+    lines = []
+    _banner(lines, "步骤 1: 测试模块导入", leading_newline=False)
     
-    try:
-        from data_diff.migration import (
-            MigrationAgent, MigrationTask, MigrationStatus,
-            SQLTranslator, DatabaseDialect, MigrationValidator
-        )
-        print("✓ Migration Agent 模块导入成功")
-    except Exception as e:
-        print(f"✗ Migration Agent 模块导入失败: {e}")
-        return False
+    ok = True
+    for label, module, expected in EXPECTED_EXPORTS:
+        path = _module_path(module)
+        if path is None:
+            lines.append(f"✗ {label} 模块不存在: {module}")
+            ok = False
+            break
+        try:
+            exports = _module_exports(path)
+        except (OSError, SyntaxError) as e:
+            lines.append(f"✗ {label} 模块解析失败: {e}")
+            ok = False
+            break
+        
+        missing = [name for name in expected if name not in exports]
+        if missing:
+            lines.append(f"✗ {label} 模块缺少导出: {', '.join(missing)}")
+            ok = False
+            break
+        _ok(lines, f"✓ {label} 模块检查通过")
     
-    return True
+    _write(lines)
+    return ok
 
 
 def test_basic_functionality():
     """测试基本功能"""
-    print("\n" + "=" * 60)
-    print("步骤 2: 测试基本功能")
-    print("=" * 60)
+    lines = []
+    _banner(lines, "步骤 2: 测试基本功能")
     
     try:
         from data_diff.monitor import DataMonitor, MonitorRule, MonitorType, RuleOperator
         
         # 创建监控器
         monitor = DataMonitor()
-        print("✓ 创建 DataMonitor 实例成功")
+        _ok(lines, "✓ 创建 DataMonitor 实例成功")
         
         # 创建规则（不连接真实数据库）
         rule = MonitorRule(
@@ -67,24 +136,26 @@ def test_basic_functionality():
             threshold_value=1.0
         )
         monitor.add_rule(rule)
-        print("✓ 创建并添加监控规则成功")
+        _ok(lines, "✓ 创建并添加监控规则成功")
         
         # 获取规则
         retrieved_rule = monitor.get_rule("test_rule")
         if retrieved_rule and retrieved_rule.name == "test_rule":
-            print("✓ 获取监控规则成功")
+            _ok(lines, "✓ 获取监控规则成功")
         else:
-            print("✗ 获取监控规则失败")
+            lines.append("✗ 获取监控规则失败")
+            _write(lines)
             return False
         
         # 测试告警管理器
         from data_diff.monitor import AlertManager, AlertChannel
         alert_manager = AlertManager()
         alert_manager.add_channel(AlertChannel.LOG)
-        print("✓ 创建告警管理器成功")
+        _ok(lines, "✓ 创建告警管理器成功")
         
     except Exception as e:
-        print(f"✗ 基本功能测试失败: {e}")
+        lines.append(f"✗ 基本功能测试失败: {e}")
+        _write(lines)
         import traceback
         traceback.print_exc()
         return False
@@ -94,7 +165,7 @@ def test_basic_functionality():
         
         # 创建迁移代理
         agent = MigrationAgent()
-        print("✓ 创建 MigrationAgent 实例成功")
+        _ok(lines, "✓ 创建 MigrationAgent 实例成功")
         
         # 测试 SQL 转换器
         translator = SQLTranslator()
@@ -105,24 +176,25 @@ def test_basic_functionality():
             DatabaseDialect.POSTGRESQL
         )
         if pg_sql and pg_sql != mysql_sql:
-            print("✓ SQL 转换功能正常")
+            _ok(lines, "✓ SQL 转换功能正常")
         else:
-            print("⚠ SQL 转换结果异常（可能正常，取决于转换规则）")
+            lines.append("⚠ SQL 转换结果异常（可能正常，取决于转换规则）")
         
     except Exception as e:
-        print(f"✗ 迁移功能测试失败: {e}")
+        lines.append(f"✗ 迁移功能测试失败: {e}")
+        _write(lines)
         import traceback
         traceback.print_exc()
         return False
     
+    _write(lines)
     return True
 
 
 def test_dependencies():
     """测试依赖项"""
-    print("\n" + "=" * 60)
-    print("步骤 3: 检查依赖项")
-    print("=" * 60)
+    lines = []
+    _banner(lines, "步骤 3: 检查依赖项")
     
     dependencies = {
         "croniter": "用于定时调度",
@@ -131,24 +203,26 @@ def test_dependencies():
     
     all_ok = True
     for dep, desc in dependencies.items():
-        try:
-            __import__(dep)
-            print(f"✓ {dep} 已安装 - {desc}")
-        except ImportError:
-            print(f"✗ {dep} 未安装 - {desc}")
-            print(f"  安装命令: pip install {dep}")
+        # 只查找不导入，避免执行依赖的初始化代码
+        if importlib.util.find_spec(dep) is not None:
+            _ok(lines, f"✓ {dep} 已安装 - {desc}")
+        else:
+            lines.append(f"✗ {dep} 未安装 - {desc}")
+            lines.append(f"  安装命令: pip install {dep}")
             all_ok = False
     
+    _write(lines)
     return all_ok
 
 
 def show_usage_examples():
     """显示使用示例"""
-    print("\n" + "=" * 60)
-    print("步骤 4: 使用示例")
-    print("=" * 60)
+    if QUIET:
+        return
     
-    print("""
+    lines = []
+    _banner(lines, "步骤 4: 使用示例")
+    lines.append("""
 📝 最简单的使用方式：
 
 1. 数据监控（需要真实数据库连接）：
@@ -203,39 +277,58 @@ def show_usage_examples():
    - examples/migration_example.py
    - MONITOR_AND_MIGRATION.md
 """)
+    _write(lines)
 
 
-def main():
+def main(argv=None):
     """主函数"""
-    print("\n" + "🚀 DataMonitor & Migration Agent 快速测试" + "\n")
+    global QUIET
+    parser = argparse.ArgumentParser(description="验证 DataMonitor 和 Migration Agent 是否可以正常运行")
+    parser.add_argument("-q", "--quiet", action="store_true", help="只输出失败信息和最终结果")
+    QUIET = parser.parse_args(argv).quiet
+    
+    # 输出已按块合并写出，不需要逐行刷新
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(line_buffering=False)
+    
+    if not QUIET:
+        _write(["\n" + "🚀 DataMonitor & Migration Agent 快速测试" + "\n"])
     
     # 测试导入
     if not test_imports():
-        print("\n❌ 模块导入失败，请检查代码")
+        _write(["\n❌ 模块导入失败，请检查代码"])
         return 1
     
     # 测试依赖
     deps_ok = test_dependencies()
     if not deps_ok:
-        print("\n⚠️  部分依赖未安装，某些功能可能无法使用")
-        print("   建议运行: pip install croniter requests")
+        _write([
+            "\n⚠️  部分依赖未安装，某些功能可能无法使用",
+            "   建议运行: pip install croniter requests",
+        ])
     
     # 测试基本功能
     if not test_basic_functionality():
-        print("\n❌ 基本功能测试失败")
+        _write(["\n❌ 基本功能测试失败"])
         return 1
     
     # 显示使用示例
     show_usage_examples()
     
-    print("\n" + "=" * 60)
-    print("✅ 所有测试通过！系统可以正常使用")
-    print("=" * 60)
-    print("\n💡 下一步:")
-    print("   1. 准备测试数据库连接")
-    print("   2. 运行 examples/migration_example.py 查看完整示例")
-    print("   3. 根据实际需求配置监控规则")
-    print("\n")
+    if QUIET:
+        _write(["✅ 所有测试通过"])
+        return 0
+    
+    _write([
+        "\n" + "=" * 60,
+        "✅ 所有测试通过！系统可以正常使用",
+        "=" * 60,
+        "\n💡 下一步:",
+        "   1. 准备测试数据库连接",
+        "   2. 运行 examples/migration_example.py 查看完整示例",
+        "   3. 根据实际需求配置监控规则",
+        "\n",
+    ])
     
     return 0
 
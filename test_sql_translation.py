@@ -15,44 +15,30 @@ def test_sql_translation():
     
     translator = SQLTranslator()
     
-    # 测试用例
-    test_cases = [
-        {
-            "name": "MySQL LIMIT 语法",
-            "sql": "SELECT * FROM `users` LIMIT 10, 20",
-            "from": DatabaseDialect.MYSQL,
-            "to": DatabaseDialect.POSTGRESQL
-        },
-        {
-            "name": "MySQL 反引号",
-            "sql": "SELECT `id`, `name` FROM `users`",
-            "from": DatabaseDialect.MYSQL,
-            "to": DatabaseDialect.POSTGRESQL
-        },
-        {
-            "name": "MySQL AUTO_INCREMENT",
-            "sql": "CREATE TABLE test (id INT AUTO_INCREMENT PRIMARY KEY)",
-            "from": DatabaseDialect.MYSQL,
-            "to": DatabaseDialect.POSTGRESQL
-        }
+    # 测试用例按列存放：名称、SQL、源方言、目标方言
+    names = ["MySQL LIMIT 语法", "MySQL 反引号", "MySQL AUTO_INCREMENT"]
+    sqls = [
+        "SELECT * FROM `users` LIMIT 10, 20",
+        "SELECT `id`, `name` FROM `users`",
+        "CREATE TABLE test (id INT AUTO_INCREMENT PRIMARY KEY)",
     ]
+    froms = [DatabaseDialect.MYSQL] * len(sqls)
+    tos = [DatabaseDialect.POSTGRESQL] * len(sqls)
     
-    for i, test in enumerate(test_cases, 1):
-        print(f"\n测试 {i}: {test['name']}")
-        print(f"原始 SQL ({test['from'].value}):")
-        print(f"  {test['sql']}")
-        
-        try:
-            translated = translator.translate(
-                test['sql'],
-                test['from'],
-                test['to']
-            )
-            print(f"转换后 SQL ({test['to'].value}):")
-            print(f"  {translated}")
-            print("✓ 转换成功")
-        except Exception as e:
-            print(f"✗ 转换失败: {e}")
+    # 一次调用转换全部用例
+    try:
+        results = translator.translate_batch(sqls, froms, tos)
+    except Exception as e:
+        print(f"\n✗ 转换失败: {e}")
+        return
+    
+    for i, (name, sql, source, target, translated) in enumerate(zip(names, sqls, froms, tos, results), 1):
+        print(f"\n测试 {i}: {name}")
+        print(f"原始 SQL ({source.value}):")
+        print(f"  {sql}")
+        print(f"转换后 SQL ({target.value}):")
+        print(f"  {translated}")
+        print("✓ 转换成功")
     
     print("\n" + "=" * 60)
     print("✅ SQL 转换功能测试完成")
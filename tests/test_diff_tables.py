@@ -911,3 +911,46 @@ class TestCompoundKeyAlphanum(DiffTestCase):
         self.assertEqual(diff, [("-", (uuid, "9", "9")), ("+", (uuid, "9000", "9"))])
 
         self.assertRaises(ValueError, list, differ.diff_tables(aa, a))
+
+
+@test_each_database_in_list(TEST_DATABASES | {db.DuckDB})
+class TestDiffResultStats(DiffTestCase):
+    src_schema = {"id": int, "v": int}
+    dst_schema = {"id": int, "v": int}
+
+    def setUp(self):
+        super().setUp()
+        # 10 rows only in src, 10 rows only in dst, 5 updated rows
+        src_rows = [[i, i] for i in range(100)]
+        dst_rows = [[i, -i if 50 <= i < 55 else i] for i in range(10, 110)]
+        self.connection.query([self.src_table.insert_rows(src_rows), self.dst_table.insert_rows(dst_rows), commit])
+        self.a = table_segment(self.connection, self.table_src_path, "id", extra_columns=("v",), case_sensitive=False)
+        self.b = table_segment(self.connection, self.table_dst_path, "id", extra_columns=("v",), case_sensitive=False)
+        self.differs = [HashDiffer(bisection_factor=4, bisection_threshold=16), JoinDiffer()]
+
+    def test_keep_rows_gives_same_stats(self):
+        for differ in self.differs:
+            with self.subTest(differ=type(differ).__name__):
+                kept = differ.diff_tables(self.a, self.b).get_stats_dict(keep_rows=True)
+                streamed_result = differ.diff_tables(self.a, self.b)
+                streamed = streamed_result.get_stats_dict(keep_rows=False)
+                self.assertEqual(kept, streamed)
+                self.assertEqual(
+                    (streamed["exclusive_A"], streamed["exclusive_B"], streamed["updated"], streamed["total"]),
+                    (10, 10, 5, 25),
+                )
+                self.assertEqual(streamed_result.result_list, [])
+
+    def test_counts_after_partial_iteration(self):
+        for differ in self.differs:
+            with self.subTest(differ=type(differ).__name__):
+                expected = differ.diff_tables(self.a, self.b).get_stats_dict()
+                diff_res = differ.diff_tables(self.a, self.b)
+                iterator = iter(diff_res)
+                next(iterator)
+                next(iterator)
+                self.assertEqual(diff_res.get_diff_count(), expected["total"])
+                self.assertEqual(diff_res.get_row_counts(), (expected["rows_A"], expected["rows_B"]))
+                # The rows read before the counters are still part of the full diff
+                self.assertEqual(len(list(diff_res)), 30)
+                self.assertEqual(diff_res.get_stats_dict(), expected)
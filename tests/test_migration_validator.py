@@ -0,0 +1,154 @@
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import duckdb
+
+from data_diff.migration.validator import MigrationValidator
+from data_diff.table_segment import TableSegment
+
+
+class TestMigrationValidator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.db_path = os.path.join(cls.tmp.name, "validator.duckdb")
+        conn = duckdb.connect(cls.db_path)
+        conn.execute("CREATE TABLE src AS SELECT range AS id, range * 2 AS v FROM range(20000)")
+        # The last 10% of the keys were never copied
+        conn.execute("CREATE TABLE tail_missing AS SELECT * FROM src WHERE id < 18000")
+        conn.execute("CREATE TABLE copy AS SELECT * FROM src")
+        conn.execute("CREATE TABLE empty AS SELECT * FROM src WHERE false")
+        conn.close()
+        cls.url = f"duckdb://{cls.db_path}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.validator = MigrationValidator()
+
+    def tearDown(self):
+        self.validator.close()
+
+    def validate(self, target_table: str, **kwargs):
+        return self.validator.validate(self.url, "src", self.url, target_table, extra_columns=("v",), **kwargs)
+
+    def test_full_compare(self):
+        result = self.validate("tail_missing")
+        self.assertFalse(result["success"])
+        self.assertEqual(result["diff_count"], 2000)
+        self.assertEqual((result["row_count_source"], result["row_count_target"]), (20000, 18000))
+        self.assertFalse(result["sampled"])
+        self.assertEqual(result["stats"]["exclusive_A"], 2000)
+
+    def test_identical_tables_skip_row_counts(self):
+        with patch.object(TableSegment, "count", autospec=True, side_effect=TableSegment.count) as count:
+            result = self.validate("copy")
+        self.assertTrue(result["success"])
+        self.assertEqual((result["row_count_source"], result["row_count_target"]), (20000, 20000))
+        count.assert_not_called()
+
+    def test_differences_count_source_only(self):
+        with patch.object(TableSegment, "count", autospec=True, side_effect=TableSegment.count) as count:
+            result = self.validate("tail_missing")
+        self.assertEqual((result["row_count_source"], result["row_count_target"]), (20000, 18000))
+        self.assertEqual(count.call_count, 1)
+
+    def test_result_is_json_serializable(self):
+        result = self.validate("tail_missing")
+        self.assertIs(type(result["stats"]), dict)
+        self.assertEqual(json.loads(json.dumps(result))["stats"]["exclusive_A"], 2000)
+
+    def test_sampling_is_opt_in(self):
+        result = self.validate("tail_missing", threshold=5.0)
+        self.assertFalse(result["sampled"])
+        self.assertFalse(result["success"])
+
+    def test_sampling_detects_clustered_differences(self):
+        for _ in range(5):
+            result = self.validate("tail_missing", threshold=5.0, sample_size=2000)
+            self.assertTrue(result["sampled"])
+            self.assertFalse(result["success"])
+            # Full counts are reported, the sample counts separately
+            self.assertEqual((result["row_count_source"], result["row_count_target"]), (20000, 18000))
+            self.assertLess(result["sample_rows_source"], 20000)
+            self.assertGreater(result["sample_rows_source"], 1000)
+            self.assertGreater(result["diff_count"], 0)
+            self.assertLess(result["sample_rows_target"], result["sample_rows_source"])
+
+    def test_sampling_passes_identical_tables(self):
+        result = self.validate("copy", threshold=5.0, sample_size=2000)
+        self.assertTrue(result["sampled"])
+        self.assertTrue(result["success"])
+        self.assertEqual(result["diff_count"], 0)
+        self.assertEqual(result["sample_rows_source"], result["sample_rows_target"])
+
+    def test_zero_threshold_never_samples(self):
+        result = self.validate("copy", sample_size=2000)
+        self.assertFalse(result["sampled"])
+        self.assertTrue(result["success"])
+
+    def test_empty_side(self):
+        result = self.validate("empty")
+        self.assertFalse(result["success"])
+        self.assertEqual(result["diff_count"], 20000)
+        self.assertEqual(result["stats"]["exclusive_A"], 20000)
+        self.assertEqual((result["row_count_source"], result["row_count_target"]), (20000, 0))
+
+    def test_validate_batch_keeps_order(self):
+        batch = self.validator.validate_batch(
+            [
+                {"source_database": self.url, "source_table": "src", "target_database": self.url, "target_table": t}
+                for t in ("copy", "tail_missing", "copy")
+            ]
+        )
+        self.assertEqual(batch["passed"], 2)
+        self.assertEqual([r["success"] for r in batch["results"]], [True, False, True])
+
+    def test_connections_are_reused(self):
+        self.assertTrue(self.validate("copy")["success"])
+        (db,) = self.validator._connections.values()
+        self.assertTrue(self.validate("copy")["success"])
+        self.assertEqual(list(self.validator._connections.values()), [db])
+        self.assertEqual(self.validator._leases, {})
+
+    def test_error_closes_connections(self):
+        self.validate("copy")
+        (db,) = self.validator._connections.values()
+        result = self.validate("no_such_table")
+        self.assertFalse(result["success"])
+        self.assertTrue(db.is_closed)
+        self.assertEqual(len(self.validator._connections), 0)
+        self.assertTrue(self.validate("copy")["success"])
+
+    def test_evicted_connections_are_closed(self):
+        validator = MigrationValidator(connection_cache_size=1)
+        with validator:
+            validator.validate(self.url, "src", self.url, "copy")
+            (first,) = validator._connections.values()
+            validator.validate(self.url, "src", self.url, "copy", threads=2)
+            (second,) = validator._connections.values()
+            self.assertIsNot(first, second)
+            self.assertTrue(first.is_closed)
+            self.assertFalse(second.is_closed)
+        self.assertTrue(second.is_closed)
+        self.assertEqual(validator._connections, {})
+
+    def test_clear_connections(self):
+        self.validate("copy")
+        (db,) = self.validator._connections.values()
+        self.validator.clear_connections("duckdb://elsewhere")
+        self.assertFalse(db.is_closed)
+        self.validator.clear_connections(self.url)
+        self.assertTrue(db.is_closed)
+
+    def test_pickle_drops_connections(self):
+        self.validate("copy")
+        copy = pickle.loads(pickle.dumps(self.validator))
+        self.assertEqual(copy._connections, {})
+        self.assertEqual(len(self.validator._connections), 1)
@@ -0,0 +1,350 @@
+import json
+import os
+import smtplib
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import duckdb
+
+from data_diff.monitor import DataMonitor, MonitorRule, MonitorType
+from data_diff.monitor import alert
+from data_diff.monitor import monitor as monitor_module
+from data_diff.monitor.alert import AlertChannel, AlertConfig, AlertManager
+from data_diff.monitor.monitor import MonitorResult
+
+
+class DuckDBTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "monitor.duckdb")
+        conn = duckdb.connect(self.db_path)
+        conn.execute("CREATE TABLE a AS SELECT range AS id, range AS v FROM range(10)")
+        conn.execute("CREATE TABLE b AS SELECT range AS id, range AS v FROM range(7)")
+        conn.close()
+        self.url = f"duckdb://{self.db_path}"
+        self.monitor = DataMonitor()
+
+    def tearDown(self):
+        self.monitor.invalidate()
+        self.tmp.cleanup()
+
+    def add_rule(self, name: str = "rule", monitor_type: MonitorType = MonitorType.ROW_COUNT, **kwargs) -> MonitorRule:
+        kwargs.setdefault("database2", self.url)
+        rule = MonitorRule(name=name, monitor_type=monitor_type, database1=self.url, table1="a", table2="b", **kwargs)
+        self.monitor.add_rule(rule)
+        return rule
+
+
+class TestConnectionCache(DuckDBTestCase):
+    def test_connections_are_reused(self):
+        self.add_rule()
+        self.assertTrue(self.monitor.run_monitor("rule").success)
+        (db,) = self.monitor._connections.values()
+        self.assertTrue(self.monitor.run_monitor("rule").success)
+        self.assertEqual(list(self.monitor._connections.values()), [db])
+
+    def test_failed_run_reconnects(self):
+        self.add_rule()
+        self.assertTrue(self.monitor.run_monitor("rule").success)
+        (db,) = self.monitor._connections.values()
+
+        with patch.object(type(db), "query", side_effect=ConnectionError("connection lost")):
+            result = self.monitor.run_monitor("rule")
+        self.assertFalse(result.success)
+        self.assertTrue(db.is_closed)
+        self.assertEqual(len(self.monitor._connections), 0)
+
+        result = self.monitor.run_monitor("rule")
+        self.assertTrue(result.success)
+        self.assertEqual((result.row_count_table1, result.row_count_table2), (10, 7))
+        self.assertIsNot(self.monitor._connections[self.url], db)
+
+    def test_evicted_connections_are_closed_after_use(self):
+        other_path = os.path.join(self.tmp.name, "other.duckdb")
+        duckdb.connect(other_path).execute("CREATE TABLE b AS SELECT range AS id FROM range(3)").close()
+        self.add_rule(database2=f"duckdb://{other_path}")
+
+        with patch.object(monitor_module, "CONNECTION_CACHE_SIZE", 1):
+            result = self.monitor.run_monitor("rule")
+        # The first connection was evicted while the run still used it, and closed once the run ended
+        self.assertTrue(result.success)
+        self.assertEqual((result.row_count_table1, result.row_count_table2), (10, 3))
+        self.assertEqual(self.monitor._leases, {})
+        self.assertEqual(self.monitor._retired, {})
+        (kept,) = self.monitor._connections.values()
+        self.assertFalse(kept.is_closed)
+
+    def test_invalidate_closes_connections(self):
+        self.add_rule()
+        self.monitor.run_monitor("rule")
+        (db,) = self.monitor._connections.values()
+        self.monitor.invalidate(self.url, "a")
+        self.assertFalse(db.is_closed)
+        self.monitor.invalidate(self.url)
+        self.assertTrue(db.is_closed)
+
+
+class TestChangeCounter(DuckDBTestCase):
+    def setUp(self):
+        super().setUp()
+        self.execute("CREATE TABLE counters (name VARCHAR, counter INTEGER)")
+        self.execute("INSERT INTO counters VALUES ('a', 5), ('b', 5)")
+
+    def execute(self, sql: str) -> None:
+        db = self.monitor._connections.get(self.url)
+        if db is None:
+            conn = duckdb.connect(self.db_path)
+            conn.execute(sql)
+            conn.close()
+        else:
+            db.query(sql)
+
+    def run_rule(self):
+        result = self.monitor.run_monitor("rule")
+        self.assertTrue(result.success, result.error)
+        return result
+
+    def test_first_run_diffs(self):
+        # Equal counters on both sides say nothing about the data: the tables still differ
+        self.add_rule(monitor_type=MonitorType.DATA_DIFF, counter_table="counters")
+        result = self.run_rule()
+        self.assertNotIn("skipped", result.stats)
+        self.assertEqual(result.diff_count, 3)
+        self.assertEqual((result.row_count_table1, result.row_count_table2), (10, 7))
+        self.assertEqual(result.stats["change_counters"], [5, 5])
+
+    def test_unchanged_counters_reuse_previous_result(self):
+        self.add_rule(monitor_type=MonitorType.DATA_DIFF, counter_table="counters",
+                      threshold_type="diff_count", threshold_value=0)
+        first = self.run_rule()
+        second = self.run_rule()
+        self.assertTrue(second.stats["skipped"])
+        self.assertEqual(second.diff_count, first.diff_count)
+        self.assertEqual(second.diff_percent, first.diff_percent)
+        self.assertEqual((second.row_count_table1, second.row_count_table2), (10, 7))
+        self.assertTrue(second.triggered)
+        self.assertNotIn("skipped", first.stats)
+
+    def test_changed_counter_diffs_again(self):
+        self.add_rule(monitor_type=MonitorType.DATA_DIFF, counter_table="counters")
+        self.run_rule()
+        self.execute("INSERT INTO b SELECT range, range FROM range(7, 10)")
+        self.execute("UPDATE counters SET counter = 6 WHERE name = 'b'")
+        result = self.run_rule()
+        self.assertNotIn("skipped", result.stats)
+        self.assertEqual(result.diff_count, 0)
+        self.assertEqual(result.stats["change_counters"], [5, 6])
+
+    def test_same_database_mode(self):
+        self.add_rule(monitor_type=MonitorType.DATA_DIFF, counter_table="counters", database2=None)
+        self.assertEqual(self.run_rule().diff_count, 3)
+        self.assertTrue(self.run_rule().stats["skipped"])
+        self.execute("UPDATE counters SET counter = 6 WHERE name = 'a'")
+        self.assertNotIn("skipped", self.run_rule().stats)
+
+    def test_missing_counter_row_diffs(self):
+        self.execute("DELETE FROM counters WHERE name = 'b'")
+        self.add_rule(monitor_type=MonitorType.DATA_DIFF, counter_table="counters")
+        self.run_rule()
+        result = self.run_rule()
+        self.assertNotIn("skipped", result.stats)
+        self.assertNotIn("change_counters", result.stats)
+        self.assertEqual(result.diff_count, 3)
+
+    def test_missing_counter_table_falls_back(self):
+        self.add_rule(monitor_type=MonitorType.DATA_DIFF, counter_table="no_such_table")
+        for _ in range(2):
+            result = self.run_rule()
+            self.assertNotIn("skipped", result.stats)
+            self.assertEqual(result.diff_count, 3)
+
+    def test_replacing_rule_forgets_counters(self):
+        rule = self.add_rule(monitor_type=MonitorType.DATA_DIFF, counter_table="counters")
+        self.run_rule()
+        self.monitor.add_rule(rule)
+        self.assertNotIn("skipped", self.run_rule().stats)
+
+
+class TestThreshold(DuckDBTestCase):
+    def test_threshold_changes_take_effect(self):
+        # Row counts are 10 and 7, so diff_count is 3
+        rule = self.add_rule(threshold_type="diff_count", threshold_value=5)
+        self.assertFalse(self.monitor.run_monitor("rule").triggered)
+        rule.threshold_value = 2
+        self.assertTrue(self.monitor.run_monitor("rule").triggered)
+        rule.threshold_operator = monitor_module.RuleOperator.LT
+        self.assertFalse(self.monitor.run_monitor("rule").triggered)
+        rule.threshold_type = None
+        self.assertFalse(self.monitor.run_monitor("rule").triggered)
+
+    def test_readding_same_rule_does_not_warn(self):
+        rule = self.add_rule()
+        with patch.object(monitor_module.logger, "warning") as warning:
+            self.monitor.add_rule(rule)
+            warning.assert_not_called()
+            self.add_rule()
+            warning.assert_called_once()
+
+
+class TestResultIndex(DuckDBTestCase):
+    def setUp(self):
+        with patch.object(monitor_module, "MAX_RESULTS", 5):
+            super().setUp()
+
+    def make_result(self, rule_name: str, diff_count: int) -> MonitorResult:
+        return MonitorResult(rule_name=rule_name, timestamp=datetime.now(), success=True, diff_count=diff_count)
+
+    def assert_index_consistent(self):
+        results = list(self.monitor.results)
+        rule_names = {result.rule_name for result in results}
+        self.assertEqual(set(self.monitor._results_by_rule), rule_names)
+        for rule_name in rule_names:
+            expected = [result for result in results if result.rule_name == rule_name]
+            self.assertEqual(list(self.monitor._results_by_rule[rule_name]), expected)
+            self.assertEqual(self.monitor.get_results(rule_name), expected)
+
+    def test_eviction_keeps_index_in_sync(self):
+        self.assertEqual(self.monitor.results.maxlen, 5)
+        for i in range(12):
+            self.monitor._append_result(self.make_result("ab"[i % 3 == 0], i))
+            self.assert_index_consistent()
+        self.assertEqual([result.diff_count for result in self.monitor.results], [7, 8, 9, 10, 11])
+        self.assertEqual([result.diff_count for result in self.monitor.get_results("b")], [9])
+
+    def test_rule_evicted_entirely(self):
+        self.monitor._append_result(self.make_result("old", 0))
+        for i in range(5):
+            self.monitor._append_result(self.make_result("new", i))
+        self.assertNotIn("old", self.monitor._results_by_rule)
+        self.assertEqual(self.monitor.get_results("old"), [])
+        self.assert_index_consistent()
+
+    def test_get_results_limit(self):
+        for i in range(5):
+            self.monitor._append_result(self.make_result("a", i))
+        self.assertEqual([result.diff_count for result in self.monitor.get_results("a", limit=2)], [3, 4])
+        self.assertEqual(self.monitor.get_results("a", limit=0), [])
+
+    def test_replaced_rule(self):
+        self.add_rule()
+        self.monitor.run_monitor("rule")
+        self.monitor.run_monitor("rule")
+        self.assertTrue(self.monitor.remove_rule("rule"))
+        self.assert_index_consistent()
+        self.assertEqual(len(self.monitor.get_results("rule")), 2)
+
+        # The replacement compares a with itself; its results follow the old ones under the same name
+        self.monitor.add_rule(
+            MonitorRule(
+                name="rule", monitor_type=MonitorType.ROW_COUNT, database1=self.url, table1="a",
+                database2=self.url, table2="a",
+            )
+        )
+        for _ in range(4):
+            self.monitor.run_monitor("rule")
+            self.assert_index_consistent()
+        self.assertEqual([result.diff_count for result in self.monitor.get_results("rule")], [3, 0, 0, 0, 0])
+
+        self.add_rule("other")
+        self.monitor.run_monitor("other")
+        self.assert_index_consistent()
+        self.assertEqual(len(self.monitor.get_results("rule")), 4)
+
+
+class TestAlertEncoding(unittest.TestCase):
+    def test_non_string_keys(self):
+        data = {"stats": {1: "a", 2.5: "b", None: "c"}, "rule": "r"}
+        self.assertEqual(json.loads(alert._encode_json(data)), json.loads(json.dumps(data)))
+
+    def test_large_integers(self):
+        self.assertEqual(json.loads(alert._encode_json({"n": 2**70})), {"n": 2**70})
+
+
+class TestAlertPooling(unittest.TestCase):
+    def setUp(self):
+        self.manager = AlertManager()
+        self.rule = MonitorRule(name="rule", monitor_type=MonitorType.ROW_COUNT, database1="duckdb://", table1="a")
+
+    def tearDown(self):
+        self.manager.close()
+
+    @staticmethod
+    def make_result(triggered: bool = True) -> MonitorResult:
+        return MonitorResult(rule_name="rule", timestamp=datetime.now(), success=True, diff_count=3, triggered=triggered)
+
+    @unittest.skipIf(alert.requests is None, "requests not installed")
+    def test_http_channels_share_one_session(self):
+        self.manager.add_channel(AlertChannel.WEBHOOK, {"url": "http://hooks.invalid/webhook"})
+        self.manager.add_channel(AlertChannel.SLACK, {"webhook_url": "http://hooks.invalid/slack"})
+        session = self.manager._session
+        with patch.object(session, "post") as post:
+            for _ in range(3):
+                self.manager.send_alert(self.rule, self.make_result())
+            self.manager.close()
+        self.assertEqual(post.call_count, 6)
+        self.assertIs(self.manager._session, session)
+        urls = sorted(call.args[0] for call in post.call_args_list)
+        self.assertEqual(urls, ["http://hooks.invalid/slack"] * 3 + ["http://hooks.invalid/webhook"] * 3)
+
+    def test_untriggered_result_is_not_sent(self):
+        self.manager.add_channel(AlertChannel.LOG)
+        self.manager.send_alert(self.rule, self.make_result(triggered=False))
+        self.assertEqual(self.manager.get_alert_history(), [])
+
+    def add_email_channel(self):
+        self.manager.add_channel(AlertChannel.EMAIL, {"smtp_host": "mail.invalid", "to_emails": ["ops@example.com"]})
+
+    def test_smtp_connection_is_reused(self):
+        self.add_email_channel()
+        with patch.object(alert.smtplib, "SMTP") as smtp:
+            for _ in range(3):
+                self.manager.send_alert(self.rule, self.make_result())
+            smtp.assert_called_once_with("mail.invalid", 25)
+            self.assertEqual(smtp.return_value.send_message.call_count, 3)
+            self.manager.close()
+            smtp.return_value.quit.assert_called_once()
+        self.assertEqual(self.manager._smtp_pool, {})
+
+    def test_smtp_reconnects_once_after_disconnect(self):
+        self.add_email_channel()
+        stale, fresh = MagicMock(), MagicMock()
+        stale.send_message.side_effect = smtplib.SMTPServerDisconnected()
+        with patch.object(alert.smtplib, "SMTP", side_effect=[stale, fresh]):
+            self.manager.send_alert(self.rule, self.make_result())
+        fresh.send_message.assert_called_once()
+        self.assertIs(self.manager._smtp_pool[("mail.invalid", 25, None)], fresh)
+
+
+class TestAlertDispatch(unittest.TestCase):
+    def setUp(self):
+        self.manager = AlertManager()
+        self.rule = MonitorRule(name="rule", monitor_type=MonitorType.ROW_COUNT, database1="duckdb://", table1="a")
+        self.result = MonitorResult(rule_name="rule", timestamp=datetime.now(), success=True, triggered=True)
+
+    def tearDown(self):
+        self.manager.close()
+
+    def sent_log_alerts(self) -> int:
+        with patch.object(alert.logger, "warning") as warning:
+            self.manager.send_alert(self.rule, self.result)
+        return warning.call_count
+
+    def test_direct_edits_to_channels_are_used(self):
+        self.assertEqual(self.sent_log_alerts(), 0)
+        self.manager.channels[AlertChannel.LOG] = AlertConfig(channel=AlertChannel.LOG)
+        self.assertEqual(self.sent_log_alerts(), 1)
+        self.manager.channels[AlertChannel.LOG] = AlertConfig(channel=AlertChannel.LOG, enabled=False)
+        self.assertEqual(self.sent_log_alerts(), 0)
+        del self.manager.channels[AlertChannel.LOG]
+        self.manager.add_channel(AlertChannel.LOG)
+        self.assertEqual(self.sent_log_alerts(), 1)
+        self.manager.channels.clear()
+        self.assertEqual(self.sent_log_alerts(), 0)
+
+    def test_remove_channel(self):
+        self.manager.add_channel(AlertChannel.LOG)
+        self.assertEqual(self.sent_log_alerts(), 1)
+        self.manager.remove_channel(AlertChannel.LOG)
+        self.assertEqual(self.sent_log_alerts(), 0)
@@ -0,0 +1,199 @@
+import heapq
+import threading
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from data_diff.monitor import DataMonitor, MonitorRule, MonitorType
+from data_diff.monitor.monitor import MonitorResult
+from data_diff.monitor.scheduler import MonitorScheduler
+
+EVERY_MINUTE = "* * * * *"
+YEARLY = "0 0 1 1 *"
+
+
+def make_rule(name: str = "rule", schedule: str = EVERY_MINUTE, **kwargs) -> MonitorRule:
+    return MonitorRule(
+        name=name, monitor_type=MonitorType.ROW_COUNT, database1="duckdb://", table1="a", schedule=schedule, **kwargs
+    )
+
+
+def make_result(rule_name: str = "rule") -> MonitorResult:
+    return MonitorResult(rule_name=rule_name, timestamp=datetime.now(), success=True, diff_count=3, triggered=True)
+
+
+class SchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.monitor = DataMonitor()
+        self.scheduler = MonitorScheduler(self.monitor)
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def make_due(self):
+        """Move every heap entry, stale ones included, into the past"""
+        with self.scheduler._heap_lock:
+            self.scheduler._heap = [(0.0, seq, name) for _, seq, name in self.scheduler._heap]
+            heapq.heapify(self.scheduler._heap)
+
+
+class TestRescheduling(SchedulerTestCase):
+    def test_add_rule_schedules_it(self):
+        before = datetime.now()
+        self.monitor.add_rule(make_rule())
+        next_run = self.scheduler.get_next_run_time("rule")
+        self.assertGreater(next_run, before)
+        self.assertLessEqual((next_run - before).total_seconds(), 60)
+
+    def test_schedule_change_reschedules(self):
+        self.monitor.add_rule(make_rule())
+        minutely = self.scheduler.get_next_run_time("rule")
+        self.monitor.add_rule(make_rule(schedule=YEARLY))
+        yearly = self.scheduler.get_next_run_time("rule")
+        self.assertEqual((yearly.month, yearly.day, yearly.hour, yearly.minute), (1, 1, 0, 0))
+        self.assertNotEqual(minutely, yearly)
+        self.assertEqual(self.scheduler._cron_cache["rule"][0], YEARLY)
+
+        # Only the entry pushed for the new schedule is still live
+        self.make_due()
+        self.assertEqual(self.scheduler._pop_due(), ["rule"])
+
+    def test_in_place_schedule_edit_reschedules(self):
+        rule = make_rule(schedule=YEARLY)
+        self.monitor.add_rule(rule)
+        rule.schedule = "*/5 * * * *"
+        self.scheduler._sync_schedules()
+        next_run = self.scheduler.get_next_run_time("rule")
+        self.assertLessEqual((next_run - datetime.now()).total_seconds(), 300)
+        self.assertEqual(next_run.minute % 5, 0)
+
+    def test_in_place_schedule_removal_stops_rule(self):
+        rule = make_rule()
+        self.monitor.add_rule(rule)
+        rule.schedule = None
+        self.scheduler._sync_schedules()
+        self.assertIsNone(self.scheduler.get_next_run_time("rule"))
+        self.assertNotIn("rule", self.scheduler._cron_cache)
+        self.make_due()
+        self.assertEqual(self.scheduler._pop_due(), [])
+
+    def test_schedule_removed_while_due_is_not_run(self):
+        # The edit is only seen when the stale entry pops
+        rule = make_rule()
+        self.monitor.add_rule(rule)
+        rule.schedule = None
+        self.make_due()
+        self.assertEqual(self.scheduler._pop_due(), [])
+        self.assertIsNone(self.scheduler.get_next_run_time("rule"))
+        self.assertEqual(self.scheduler._heap, [])
+
+    def test_schedule_changed_while_in_heap(self):
+        rule = make_rule()
+        self.monitor.add_rule(rule)
+        rule.schedule = YEARLY
+        self.make_due()
+        self.assertEqual(self.scheduler._pop_due(), ["rule"])
+        # The next run follows the new expression
+        next_run = self.scheduler.get_next_run_time("rule")
+        self.assertEqual((next_run.month, next_run.day, next_run.hour, next_run.minute), (1, 1, 0, 0))
+        self.assertEqual(self.scheduler._cron_cache["rule"][0], YEARLY)
+
+    def test_disabled_rule_is_not_run(self):
+        rule = make_rule()
+        self.monitor.add_rule(rule)
+        rule.enabled = False
+        self.scheduler._sync_schedules()
+        self.assertIsNone(self.scheduler.get_next_run_time("rule"))
+        rule.enabled = True
+        self.scheduler._sync_schedules()
+        self.assertIsNotNone(self.scheduler.get_next_run_time("rule"))
+
+    def test_running_scheduler_picks_up_in_place_edit(self):
+        rule = make_rule(schedule=YEARLY)
+        self.monitor.add_rule(rule)
+        self.scheduler.start()
+        yearly = self.scheduler.get_next_run_time("rule")
+        rule.schedule = EVERY_MINUTE
+        deadline = time.monotonic() + 5
+        while self.scheduler.get_next_run_time("rule") == yearly and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertLessEqual((self.scheduler.get_next_run_time("rule") - datetime.now()).total_seconds(), 60)
+
+    def test_removed_rule_is_not_run(self):
+        self.monitor.add_rule(make_rule())
+        self.monitor.remove_rule("rule")
+        self.assertIsNone(self.scheduler.get_next_run_time("rule"))
+        self.assertNotIn("rule", self.scheduler._cron_cache)
+        self.make_due()
+        self.assertEqual(self.scheduler._pop_due(), [])
+
+    def test_invalid_schedule_is_not_run(self):
+        self.monitor.add_rule(make_rule(schedule="not a cron expression"))
+        self.assertIsNone(self.scheduler.get_next_run_time("rule"))
+        self.make_due()
+        self.assertEqual(self.scheduler._pop_due(), [])
+
+    def test_due_rules_are_rescheduled(self):
+        self.monitor.add_rule(make_rule("a"))
+        self.monitor.add_rule(make_rule("b", schedule=YEARLY))
+        self.make_due()
+        self.assertEqual(sorted(self.scheduler._pop_due()), ["a", "b"])
+        self.assertGreater(self.scheduler.get_next_run_time("a"), datetime.now())
+        self.assertEqual(self.scheduler._in_flight, {"a", "b"})
+        # The new entries are in the future
+        self.assertEqual(self.scheduler._pop_due(), [])
+
+
+class TestInFlight(SchedulerTestCase):
+    def test_rule_still_running_is_skipped(self):
+        self.monitor.add_rule(make_rule())
+        self.make_due()
+        self.assertEqual(self.scheduler._pop_due(), ["rule"])
+
+        self.make_due()
+        self.assertEqual(self.scheduler._pop_due(), [])
+        # The skipped run is still rescheduled
+        self.assertGreater(self.scheduler.get_next_run_time("rule"), datetime.now())
+
+        with patch.object(self.monitor, "run_monitor", return_value=make_result()):
+            self.scheduler._run_in_flight("rule")
+        self.assertEqual(self.scheduler._in_flight, set())
+        self.make_due()
+        self.assertEqual(self.scheduler._pop_due(), ["rule"])
+
+    def test_in_flight_cleared_after_error(self):
+        self.monitor.add_rule(make_rule())
+        self.make_due()
+        self.scheduler._pop_due()
+        with patch.object(self.monitor, "run_monitor", side_effect=RuntimeError("boom")):
+            self.scheduler._run_in_flight("rule")
+        self.assertEqual(self.scheduler._in_flight, set())
+
+    def test_scheduler_runs_due_rule_once_while_in_flight(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def run_monitor(rule_name):
+            calls.append(rule_name)
+            started.set()
+            release.wait(5)
+            return make_result(rule_name)
+
+        self.monitor.add_rule(make_rule())
+        with patch.object(self.monitor, "run_monitor", side_effect=run_monitor):
+            self.scheduler.start()
+            self.make_due()
+            self.scheduler._wakeup.set()
+            self.assertTrue(started.wait(5))
+
+            # Due again while the first run is still going
+            self.make_due()
+            self.scheduler._wakeup.set()
+            deadline = time.monotonic() + 5
+            while self.scheduler._heap[0][0] == 0.0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            release.set()
+            self.scheduler.stop()
+        self.assertEqual(calls, ["rule"])
@@ -0,0 +1,287 @@
+import io
+import os
+import re
+import tempfile
+import unittest
+
+from data_diff.migration import sql_translator
+from data_diff.migration.sql_translator import DatabaseDialect, SQLTranslator
+
+MYSQL = DatabaseDialect.MYSQL
+POSTGRESQL = DatabaseDialect.POSTGRESQL
+SNOWFLAKE = DatabaseDialect.SNOWFLAKE
+
+SAMPLES = [
+    "SELECT `id`, IFNULL(`name`, '') FROM `users` LIMIT 10, 20",
+    "CREATE TABLE `t` (`id` INT AUTO_INCREMENT, `body` LONGTEXT, `flag` TINYINT) ENGINE=InnoDB;",
+    "select now() from dual where x = 'ä'",
+    "SELECT 1",
+]
+
+
+def translate_per_rule(translator: SQLTranslator, sql: str, source, target) -> str:
+    """Reference implementation: one re.sub per rule, in declaration order"""
+    rules = list(translator.conversion_rules[(source, target)].items())
+    rules += [(pattern.pattern, replacement) for pattern, replacement in translator._compile_common_rules(source, target)]
+    for pattern, replacement in rules:
+        sql = re.sub(pattern, replacement, sql, flags=re.IGNORECASE)
+    return sql
+
+
+class TestSequentialRules(unittest.TestCase):
+    def setUp(self):
+        self.translator = SQLTranslator(legacy=True)
+
+    def test_matches_per_rule_re_sub(self):
+        for source, target in self.translator.conversion_rules:
+            for sql in SAMPLES:
+                self.assertEqual(
+                    self.translator.translate(sql, source, target),
+                    translate_per_rule(self.translator, sql, source, target),
+                )
+
+    def test_later_rules_see_earlier_replacements(self):
+        self.translator.conversion_rules[(MYSQL, POSTGRESQL)] = {"foo": "bar", "bar": "baz"}
+        self.assertEqual(self.translator.translate("foo", MYSQL, POSTGRESQL), "baz")
+
+    def test_single_character_rule(self):
+        self.translator.conversion_rules[(MYSQL, POSTGRESQL)] = {r"\$": "#"}
+        self.assertEqual(self.translator.translate("a$b$", MYSQL, POSTGRESQL), "a#b#")
+
+    def test_direct_edits_take_effect(self):
+        rules = self.translator.conversion_rules[(MYSQL, POSTGRESQL)]
+        self.assertIsInstance(rules, dict)
+        self.assertEqual(rules[r"AUTO_INCREMENT"], "SERIAL")
+        sql = "CREATE TABLE t (id INT AUTO_INCREMENT)"
+        self.assertIn("SERIAL", self.translator.translate(sql, MYSQL, POSTGRESQL))
+        fingerprint = self.translator.rules_fingerprint(MYSQL, POSTGRESQL)
+
+        rules[r"AUTO_INCREMENT"] = "GENERATED ALWAYS AS IDENTITY"
+        self.assertIn("GENERATED ALWAYS AS IDENTITY", self.translator.translate(sql, MYSQL, POSTGRESQL))
+        self.assertNotEqual(self.translator.rules_fingerprint(MYSQL, POSTGRESQL), fingerprint)
+
+        del rules[r"AUTO_INCREMENT"]
+        self.assertIn("AUTO_INCREMENT", self.translator.translate(sql, MYSQL, POSTGRESQL))
+
+        self.translator.conversion_rules[(SNOWFLAKE, MYSQL)] = {"foo": "bar"}
+        self.assertEqual(self.translator.translate("foo", SNOWFLAKE, MYSQL), "bar")
+        del self.translator.conversion_rules[(SNOWFLAKE, MYSQL)]
+        self.assertEqual(self.translator.translate("foo", SNOWFLAKE, MYSQL), "foo")
+
+    def test_same_dialect_is_identity(self):
+        self.assertEqual(self.translator.translate(SAMPLES[0], MYSQL, MYSQL), SAMPLES[0])
+
+    def test_missing_rules_return_sql(self):
+        self.assertEqual(self.translator.translate("SELECT 1", SNOWFLAKE, MYSQL), "SELECT 1")
+
+
+class TestFusedRules(unittest.TestCase):
+    def tearDown(self):
+        sql_translator._fuse.cache_clear()
+
+    def test_fused_applies_rules_in_one_pass(self):
+        translator = SQLTranslator(legacy=True, fused=True)
+        translator.conversion_rules[(MYSQL, POSTGRESQL)] = {"foo": "bar", "bar": "baz"}
+        self.assertEqual(translator.translate("foo bar", MYSQL, POSTGRESQL), "bar baz")
+
+    def test_fused_agrees_when_rules_do_not_interact(self):
+        sequential = SQLTranslator(legacy=True)
+        fused = SQLTranslator(legacy=True, fused=True)
+        sql = SAMPLES[0]
+        self.assertEqual(fused.translate(sql, MYSQL, POSTGRESQL), sequential.translate(sql, MYSQL, POSTGRESQL))
+
+    def test_fingerprint_depends_on_strategy(self):
+        self.assertNotEqual(
+            SQLTranslator(legacy=True).rules_fingerprint(MYSQL, POSTGRESQL),
+            SQLTranslator(legacy=True, fused=True).rules_fingerprint(MYSQL, POSTGRESQL),
+        )
+
+    @unittest.skipIf(sql_translator.hyperscan is None, "hyperscan not installed")
+    def test_hyperscan_prefilter_matches_re(self):
+        sql = "\n".join(SAMPLES) * 50
+        hyperscan = sql_translator.hyperscan
+        expected = {}
+        try:
+            for hs in (None, hyperscan):
+                sql_translator.hyperscan = hs
+                sql_translator._fuse.cache_clear()
+                for pair in SQLTranslator(legacy=True).conversion_rules:
+                    translated = SQLTranslator(legacy=True, fused=True).translate(sql, *pair)
+                    self.assertEqual(expected.setdefault(pair, translated), translated)
+        finally:
+            sql_translator.hyperscan = hyperscan
+
+
+class TestIterStatements(unittest.TestCase):
+    def split(self, text: str, chunk_size: int):
+        return list(sql_translator._iter_statements(io.StringIO(text), chunk_size))
+
+    def test_round_trip_for_any_chunk_size(self):
+        text = (
+            "SELECT 1; SELECT ';' FROM t; -- a; comment\n"
+            "SELECT \"a;b\", `c;d`; /* x; y */ SELECT 'it\\'s;';\n"
+            "SELECT 2"
+        )
+        expected = [
+            "SELECT 1;",
+            " SELECT ';' FROM t;",
+            " -- a; comment\nSELECT \"a;b\", `c;d`;",
+            " /* x; y */ SELECT 'it\\'s;';",
+            "\nSELECT 2",
+        ]
+        for chunk_size in (1, 2, 3, 7, 16, 1 << 20):
+            self.assertEqual(self.split(text, chunk_size), expected)
+
+    def test_many_short_statements(self):
+        text = "SELECT 1;" * 10000
+        statements = self.split(text, 4096)
+        self.assertEqual(len(statements), 10000)
+        self.assertEqual("".join(statements), text)
+
+    def test_empty_input(self):
+        self.assertEqual(self.split("", 16), [])
+
+    def test_translate_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src, dst = os.path.join(tmp, "in.sql"), os.path.join(tmp, "out.sql")
+            with open(src, "w", encoding="utf-8") as f:
+                f.write("SELECT `a` FROM `t`;\nSELECT ';' LIMIT 5, 10;\n")
+            SQLTranslator(legacy=True).translate_file(src, dst, MYSQL, POSTGRESQL)
+            with open(dst, encoding="utf-8") as f:
+                self.assertEqual(f.read(), "SELECT \"a\" FROM \"t\";\nSELECT ';' LIMIT 10 OFFSET 5;\n")
+
+
+MYSQL_DDL = (
+    "CREATE TABLE `orders` (`id` INT AUTO_INCREMENT, `note` LONGTEXT, PRIMARY KEY (`id`))"
+    " ENGINE=InnoDB AUTO_INCREMENT=100 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin;"
+)
+
+
+class TestDDLTranslation(unittest.TestCase):
+    def test_regex_is_the_default(self):
+        self.assertTrue(SQLTranslator().legacy)
+
+    def test_engine_is_stripped(self):
+        translator = SQLTranslator()
+        for target in (POSTGRESQL, SNOWFLAKE):
+            translated = translator.translate("CREATE TABLE t (id INT) ENGINE = InnoDB;", MYSQL, target)
+            self.assertNotIn("ENGINE", translated.upper())
+            self.assertNotIn("INNODB", translated.upper())
+
+    def test_mysql_to_postgresql_ddl(self):
+        translated = SQLTranslator().translate(MYSQL_DDL, MYSQL, POSTGRESQL)
+        self.assertTrue(translated.startswith('CREATE TABLE "orders" ("id" INT SERIAL, "note" TEXT, PRIMARY KEY ("id"))'))
+        self.assertNotIn("ENGINE", translated)
+        self.assertNotIn("`", translated)
+
+    @unittest.skipIf(sql_translator.sqlglot is None, "sqlglot not installed")
+    def test_sqlglot_strips_mysql_table_options(self):
+        translator = SQLTranslator(legacy=False)
+        for target in (POSTGRESQL, SNOWFLAKE, DatabaseDialect.CLICKHOUSE):
+            translated = translator.translate(MYSQL_DDL, MYSQL, target).upper()
+            for option in ("ENGINE", "INNODB", "AUTO_INCREMENT=", "CHARACTER SET", "COLLATE"):
+                self.assertNotIn(option, translated)
+        self.assertTrue(translated.endswith(";"))
+
+    @unittest.skipIf(sql_translator.sqlglot is None, "sqlglot not installed")
+    def test_sqlglot_does_not_modify_cached_trees(self):
+        translator = SQLTranslator(legacy=False)
+        translator.translate(MYSQL_DDL, MYSQL, POSTGRESQL)
+        (tree,) = sql_translator._sqlglot_parse(MYSQL_DDL, "mysql")
+        self.assertIn("ENGINE", tree.sql("mysql"))
+
+
+class TestAddRule(unittest.TestCase):
+    def test_regex_path(self):
+        translator = SQLTranslator()
+        translator.translate("SELECT foo FROM t", MYSQL, POSTGRESQL)
+        translator.add_rule(MYSQL, POSTGRESQL, r"\bfoo\b", "bar")
+        self.assertEqual(translator.translate("SELECT foo FROM t", MYSQL, POSTGRESQL), "SELECT bar FROM t")
+
+    def test_pair_without_builtin_rules(self):
+        translator = SQLTranslator()
+        translator.add_rule(SNOWFLAKE, MYSQL, r"\bfoo\b", "bar")
+        self.assertEqual(translator.translate("SELECT foo FROM t", SNOWFLAKE, MYSQL), "SELECT bar FROM t")
+
+    @unittest.skipIf(sql_translator.sqlglot is None, "sqlglot not installed")
+    def test_sqlglot_path(self):
+        translator = SQLTranslator(legacy=False)
+        self.assertEqual(translator.translate("SELECT foo FROM t", MYSQL, POSTGRESQL), 'SELECT "foo" FROM "t"')
+        translator.add_rule(MYSQL, POSTGRESQL, r"\bfoo\b", "bar")
+        self.assertEqual(translator.translate("SELECT foo FROM t", MYSQL, POSTGRESQL), 'SELECT "bar" FROM "t"')
+        self.assertEqual(translator.translate("SELECT foo FROM t;", MYSQL, POSTGRESQL), 'SELECT "bar" FROM "t";')
+        # Other pairs are unaffected
+        self.assertEqual(translator.translate("SELECT foo FROM t", MYSQL, SNOWFLAKE), 'SELECT "foo" FROM "t"')
+
+    @unittest.skipIf(sql_translator.sqlglot is None, "sqlglot not installed")
+    def test_sqlglot_fingerprint_changes(self):
+        translator = SQLTranslator(legacy=False)
+        before = translator.rules_fingerprint(MYSQL, POSTGRESQL)
+        translator.add_rule(MYSQL, POSTGRESQL, r"\bfoo\b", "bar")
+        self.assertNotEqual(before, translator.rules_fingerprint(MYSQL, POSTGRESQL))
+
+
+class TestTranslateBatch(unittest.TestCase):
+    PAIRS = [(MYSQL, POSTGRESQL), (MYSQL, SNOWFLAKE), (POSTGRESQL, MYSQL), (SNOWFLAKE, MYSQL), (MYSQL, MYSQL)]
+
+    def make_batch(self):
+        # Interleave the dialect pairs and repeat every statement, so groups and duplicates are mixed
+        sqls, sources, targets = [], [], []
+        for _ in range(2):
+            for i, sql in enumerate(SAMPLES):
+                for source, target in self.PAIRS[i % 2:] + self.PAIRS[: i % 2]:
+                    sqls.append(sql)
+                    sources.append(source)
+                    targets.append(target)
+        return sqls, sources, targets
+
+    def check_matches_translate(self, translator: SQLTranslator):
+        sqls, sources, targets = self.make_batch()
+        results = translator.translate_batch(sqls, sources, targets)
+        self.assertEqual(len(results), len(sqls))
+        for sql, source, target, result in zip(sqls, sources, targets, results):
+            self.assertEqual(result, translator.translate(sql, source, target))
+
+    def test_matches_translate_legacy(self):
+        self.check_matches_translate(SQLTranslator(legacy=True))
+
+    def test_matches_translate(self):
+        self.check_matches_translate(SQLTranslator())
+
+    def test_order_is_preserved(self):
+        translator = SQLTranslator(legacy=True)
+        translator.conversion_rules[(SNOWFLAKE, MYSQL)] = {"foo": "bar"}
+        results = translator.translate_batch(
+            ["foo", "foo", "SELECT 1", "foo"],
+            [SNOWFLAKE, MYSQL, SNOWFLAKE, SNOWFLAKE],
+            [MYSQL, MYSQL, MYSQL, MYSQL],
+        )
+        self.assertEqual(results, ["bar", "foo", "SELECT 1", "bar"])
+
+    def test_duplicates_are_translated_once(self):
+        translator = SQLTranslator(legacy=True)
+        calls = []
+        specialized = translator._get_specialized(MYSQL, POSTGRESQL)
+
+        def translate(sql):
+            calls.append(sql)
+            return specialized(sql)
+
+        def get_specialized(source, target):
+            calls.append((source, target))
+            return translate
+
+        translator._get_specialized = get_specialized
+        results = translator.translate_batch([SAMPLES[0], SAMPLES[3], SAMPLES[0]], [MYSQL] * 3, [POSTGRESQL] * 3)
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(calls, [(MYSQL, POSTGRESQL), SAMPLES[0], SAMPLES[3]])
+
+    def test_empty_batch(self):
+        self.assertEqual(SQLTranslator().translate_batch([], [], []), [])
+
+    def test_length_mismatch_raises(self):
+        translator = SQLTranslator()
+        with self.assertRaises(ValueError):
+            translator.translate_batch(["SELECT 1", "SELECT 2"], [MYSQL], [POSTGRESQL, POSTGRESQL])
+        with self.assertRaises(ValueError):
+            translator.translate_batch(["SELECT 1"], [MYSQL], [POSTGRESQL, POSTGRESQL])